@@ -1,4 +1,6 @@
+from .counterparty import router as counterparty_router
 from .googlesheet import router as googlesheet_router
 __all__ = [
+    'counterparty_router',
     'googlesheet_router'
 ]
\ No newline at end of file
@@ -0,0 +1,59 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+
+from app.database.repositories import GoogleSheetRepository
+from app.dependencies import get_counterparty_cache, get_googlesheet_repository
+from app.infrastructure.counterparty_cache import CounterpartyCache, etag_matches, make_etag
+
+router = APIRouter(prefix="/counterparties", tags=["Контрагенты"])
+
+
+def _cached_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    """JSON из снимка кэша; 304 без тела, если у клиента актуальная версия."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("")
+async def list_counterparties(
+        if_none_match: Optional[str] = Header(None),
+        cache: CounterpartyCache = Depends(get_counterparty_cache),
+        repository: GoogleSheetRepository = Depends(get_googlesheet_repository),
+):
+    """Все контрагенты (поля CounterpartyModel) из кэша, с ETag."""
+    snapshot = await cache.get(repository)
+    return _cached_response(snapshot.list_body, snapshot.etag, if_none_match)
+
+
+@router.get("/inn/{inn}")
+async def get_counterparties_by_inn(
+        inn: str,
+        if_none_match: Optional[str] = Header(None),
+        cache: CounterpartyCache = Depends(get_counterparty_cache),
+        repository: GoogleSheetRepository = Depends(get_googlesheet_repository),
+):
+    """Контрагенты с указанным ИНН (ИНН в таблице не уникален - возвращается список)."""
+    snapshot = await cache.get(repository)
+    bodies = snapshot.by_inn.get(inn.strip())
+    if not bodies:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Контрагент не найден")
+    body = b"[" + b",".join(bodies) + b"]"
+    return _cached_response(body, make_etag(body), if_none_match)
+
+
+@router.get("/{counterparty_id}")
+async def get_counterparty(
+        counterparty_id: int,
+        if_none_match: Optional[str] = Header(None),
+        cache: CounterpartyCache = Depends(get_counterparty_cache),
+        repository: GoogleSheetRepository = Depends(get_googlesheet_repository),
+):
+    """Контрагент по id из кэша, с ETag."""
+    snapshot = await cache.get(repository)
+    item = snapshot.by_id.get(counterparty_id)
+    if item is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Контрагент не найден")
+    body, etag = item
+    return _cached_response(body, etag, if_none_match)
@@ -1,9 +1,15 @@
 from typing import List
 from fastapi import APIRouter, Depends, status, Body, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from app.models import GoogleSheetParams
-from app.dependencies import get_googlesheet_service
-from app.service import GoogleSheetService
+from app.database.repositories import GoogleSheetRepository
+from app.models import ExportFormat, GoogleSheetParams, SyncBatchRequest, SyncBatchStatus, SyncDirection, SyncJobStatus
+from app.dependencies import get_googlesheet_repository, get_googlesheet_service, get_sync_job_manager
+from app.service import GoogleSheetService, SyncJobManager
+from app.service.export import MEDIA_TYPES, export_counterparties
+from app.infrastructure.emulator import get_emulator
+from app.infrastructure.rate_limit import sheets_limiter
+from config import settings
 router = APIRouter(prefix="/googlesheet", tags=["Работа с гугл таблицей"])
 
 """
@@ -20,21 +26,111 @@ router = APIRouter(prefix="/googlesheet", tags=["Работа с гугл таб
 }
 
 """
-@router.post("/get_data_in_sheet")
+@router.post("/get_data_in_sheet", status_code=status.HTTP_202_ACCEPTED, response_model=SyncJobStatus)
 async def get_data_in_sheet(
         gs_params: GoogleSheetParams,
-        service: GoogleSheetService =  Depends(get_googlesheet_service)
+        service: GoogleSheetService =  Depends(get_googlesheet_service),
+        jobs: SyncJobManager = Depends(get_sync_job_manager),
 ):
-    await service.add_suppliers_data_in_db(gs_params=gs_params)
-    print("OK")
-    return {"message": "OK"}
+    """Ставит в очередь синхронизацию лист -> БД и возвращает задачу."""
+    job, created = jobs.submit(
+        gs_params,
+        SyncDirection.SHEET_TO_DB,
+        lambda progress: service.add_suppliers_data_in_db(gs_params=gs_params, progress=progress),
+    )
+    print(f"Задача {job.id}: {'создана' if created else 'уже выполняется'}")
+    return job
 
 
-@router.post("/add_data_in_sheet")
+@router.post("/add_data_in_sheet", status_code=status.HTTP_202_ACCEPTED, response_model=SyncJobStatus)
 async def add_data_in_sheet(
         gs_params: GoogleSheetParams,
-        service: GoogleSheetService =  Depends(get_googlesheet_service)
+        service: GoogleSheetService =  Depends(get_googlesheet_service),
+        jobs: SyncJobManager = Depends(get_sync_job_manager),
 ):
-    await service.get_suppliers_data_from_db(gs_params=gs_params)
-    print("OK")
-    return {"message": "OK"}
+    """Ставит в очередь выгрузку БД -> лист и возвращает задачу."""
+    job, created = jobs.submit(
+        gs_params,
+        SyncDirection.DB_TO_SHEET,
+        lambda progress: service.get_suppliers_data_from_db(gs_params=gs_params, progress=progress),
+    )
+    print(f"Задача {job.id}: {'создана' if created else 'уже выполняется'}")
+    return job
+
+
+@router.post("/batch", status_code=status.HTTP_202_ACCEPTED, response_model=SyncBatchStatus)
+async def sync_batch(
+        request: SyncBatchRequest,
+        service: GoogleSheetService =  Depends(get_googlesheet_service),
+        jobs: SyncJobManager = Depends(get_sync_job_manager),
+):
+    """
+    Ставит в очередь синхронизацию нескольких листов в одном направлении.
+    Листы синхронизируются параллельно (не больше settings.SYNC_MAX_CONCURRENCY
+    одновременно) с общими пулом соединений БД и кэшем клиентов Google Sheets.
+    """
+    if request.direction == SyncDirection.SHEET_TO_DB:
+        run = service.add_suppliers_data_in_db
+    else:
+        run = service.get_suppliers_data_from_db
+    batch = jobs.submit_batch(
+        request.direction,
+        [
+            (gs_params, lambda progress, gs_params=gs_params: run(gs_params=gs_params, progress=progress))
+            for gs_params in request.targets
+        ],
+    )
+    print(f"Пакет {batch.id}: {len(batch.jobs)} задач")
+    return batch
+
+
+@router.get("/batch/{batch_id}", response_model=SyncBatchStatus)
+async def get_batch_status(
+        batch_id: str,
+        jobs: SyncJobManager = Depends(get_sync_job_manager),
+):
+    """Состояние пакета: общее время и результат с временем по каждому листу."""
+    batch = jobs.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пакет не найден")
+    return batch
+
+
+@router.get("/jobs/{job_id}", response_model=SyncJobStatus)
+async def get_job_status(
+        job_id: str,
+        jobs: SyncJobManager = Depends(get_sync_job_manager),
+):
+    """Состояние задачи синхронизации: этап, прогресс, счетчики строк и время."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена")
+    return job
+
+
+@router.get("/export")
+async def export_data(
+        export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+        compress: bool = Query(False, alias="gzip", description="сжать поток gzip (Content-Encoding: gzip)"),
+        repository: GoogleSheetRepository = Depends(get_googlesheet_repository),
+):
+    """Потоковая выгрузка контрагентов из БД в CSV или NDJSON, без обращения к листу."""
+    headers = {
+        "Content-Disposition": f'attachment; filename="counterparties.{export_format.value}"',
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_counterparties(repository, export_format, compress, batch_size=settings.EXPORT_BATCH_SIZE),
+        media_type=MEDIA_TYPES[export_format],
+        headers=headers,
+    )
+
+
+@router.get("/rate_limit")
+async def get_rate_limit_state():
+    """Состояние общего ограничителя запросов к Google Sheets (и учет запросов эмулятора)."""
+    state = sheets_limiter.state()
+    if settings.GS_BACKEND == "emulator":
+        state["emulator"] = get_emulator().stats()
+    return state
@@ -1,10 +1,100 @@
-from asyncpg import create_pool, Pool
+import asyncio
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Iterable, Optional
+
+from asyncpg import connect, create_pool, Connection, Pool
 from config import settings
+from app.infrastructure.metrics import DB_POOL_ACQUIRE_SECONDS, DB_POOL_WAITING
 
 
-async def init_db() -> Pool:
-    """Инициализация пула соединений с базой данных."""
+class InstrumentedPool:
+    """
+    Пул asyncpg (create_pool) с учетом ожидания свободного соединения в acquire().
+    Отдает ту часть интерфейса Pool, которой пользуется приложение.
+    """
+
+    def __init__(self, pool: Pool):
+        self.pool = pool
+        self.acquires = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def acquire(self, *, timeout: Optional[float] = None) -> AsyncIterator[Connection]:
+        started = time.perf_counter()
+        self.waiting += 1
+        DB_POOL_WAITING.set(self.waiting)
+        try:
+            conn = await self.pool.acquire(timeout=timeout)
+        finally:
+            wait = time.perf_counter() - started
+            self.waiting -= 1
+            self.acquires += 1
+            self.acquire_wait_total += wait
+            self.acquire_wait_max = max(self.acquire_wait_max, wait)
+            DB_POOL_WAITING.set(self.waiting)
+            DB_POOL_ACQUIRE_SECONDS.observe(wait)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    def get_size(self) -> int:
+        return self.pool.get_size()
+
+    def get_idle_size(self) -> int:
+        return self.pool.get_idle_size()
+
+    def get_min_size(self) -> int:
+        return self.pool.get_min_size()
+
+    def get_max_size(self) -> int:
+        return self.pool.get_max_size()
+
+    def stats(self) -> dict:
+        """Размер и загрузка пула, ожидание соединений с момента старта."""
+        size = self.get_size()
+        idle = self.get_idle_size()
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self.get_min_size(),
+            "max_size": self.get_max_size(),
+            "utilization": round((size - idle) / self.get_max_size(), 3),
+            "waiting": self.waiting,
+            "acquires": self.acquires,
+            "acquire_wait_avg": round(self.acquire_wait_total / self.acquires, 6) if self.acquires else 0.0,
+            "acquire_wait_max": round(self.acquire_wait_max, 6),
+        }
+
+
+async def create_app_pool(*connect_args, **connect_kwargs) -> InstrumentedPool:
+    """Пул с настройками из settings, соединения min_size открываются сразу."""
+    server_settings = {"application_name": "apk_service"}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
     pool = await create_pool(
+        *connect_args,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        max_queries=settings.DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+        command_timeout=settings.DB_COMMAND_TIMEOUT,
+        server_settings=server_settings,
+        **connect_kwargs,
+    )
+    return InstrumentedPool(pool)
+
+
+async def init_db() -> InstrumentedPool:
+    """Инициализация пула соединений с базой данных."""
+    pool = await create_app_pool(
         user=settings.POSTGRES_USER,
         password=settings.POSTGRES_PASSWORD,
         database=settings.POSTGRES_DB,
@@ -14,6 +104,39 @@ async def init_db() -> Pool:
     return pool
 
 
-async def close_db(pool: Pool) -> None:
+async def warmup_pool(pool: InstrumentedPool, statements: Iterable[str] = ()) -> None:
+    """
+    Открывает min_size соединений и заносит горячие запросы в кэш подготовленных
+    запросов asyncpg на каждом из них, чтобы первые запросы после старта не ждали
+    подключения и разбора SQL. executemany с пустым списком аргументов только
+    подготавливает запрос. Выполняется после apply_schema: подготовка ссылается
+    на актуальную схему.
+    """
+    statements = list(statements)
+
+    async def warm(conn):
+        for statement in statements:
+            await conn.executemany(statement, [])
+
+    # соединения возвращаются в пул и при ошибке подключения или подготовки
+    async with AsyncExitStack() as stack:
+        connections = [
+            await stack.enter_async_context(pool.acquire()) for _ in range(pool.get_min_size())
+        ]
+        await asyncio.gather(*(warm(conn) for conn in connections))
+
+
+async def close_db(pool: InstrumentedPool) -> None:
     """Закрытие пула соединений."""
     await pool.close()
+
+
+async def connect_db() -> Connection:
+    """Отдельное соединение вне пула (для LISTEN, которое держится все время работы)."""
+    return await connect(
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        database=settings.POSTGRES_DB,
+        host=settings.POSTGRES_HOST,
+        port=settings.POSTGRES_PORT
+    )
@@ -1,4 +1,6 @@
+from .checkpoints import SheetCheckpointRepository
 from .googlesheet import GoogleSheetRepository
 __all__ = [
-    'GoogleSheetRepository'
-]
\ No newline at end of file
+    'GoogleSheetRepository',
+    'SheetCheckpointRepository'
+]
@@ -0,0 +1,69 @@
+import json
+from typing import List, Tuple
+
+from asyncpg import Pool
+
+from app.infrastructure.checkpoint import CheckpointKey
+
+
+class SheetCheckpointRepository:
+    """
+    Журнал пачек записи в лист в test.sheet_write_checkpoints.
+
+    Интерфейс совпадает с MemoryCheckpointStore; в отличие от него журнал
+    переживает перезапуск сервиса, и следующая синхронизация листа дописывает
+    пачки, не примененные прерванной.
+    """
+
+    def __init__(self, pool: Pool):
+        self.pool = pool
+
+    async def add(self, key: CheckpointKey, payload: dict) -> int:
+        spreadsheet, sheet = key
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                INSERT INTO test.sheet_write_checkpoints (spreadsheet, sheet, batch_no, payload)
+                SELECT $1, $2, COALESCE(MAX(batch_no), 0) + 1, $3::jsonb
+                FROM test.sheet_write_checkpoints
+                WHERE spreadsheet = $1 AND sheet = $2
+                RETURNING batch_no
+                """,
+                spreadsheet, sheet, json.dumps(payload, ensure_ascii=False, default=str),
+            )
+
+    async def pending(self, key: CheckpointKey) -> List[Tuple[int, dict]]:
+        spreadsheet, sheet = key
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT batch_no, payload FROM test.sheet_write_checkpoints
+                WHERE spreadsheet = $1 AND sheet = $2 AND applied_at IS NULL
+                ORDER BY batch_no
+                """,
+                spreadsheet, sheet,
+            )
+        return [(row["batch_no"], json.loads(row["payload"])) for row in rows]
+
+    async def mark_applied(self, key: CheckpointKey, batch_no: int) -> None:
+        spreadsheet, sheet = key
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE test.sheet_write_checkpoints SET applied_at = now()
+                WHERE spreadsheet = $1 AND sheet = $2 AND batch_no = $3
+                """,
+                spreadsheet, sheet, batch_no,
+            )
+
+    async def clear(self, key: CheckpointKey) -> None:
+        """Удаляет из журнала примененные пачки листа."""
+        spreadsheet, sheet = key
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                DELETE FROM test.sheet_write_checkpoints
+                WHERE spreadsheet = $1 AND sheet = $2 AND applied_at IS NOT NULL
+                """,
+                spreadsheet, sheet,
+            )
@@ -1,80 +1,186 @@
+import datetime
 import json
 from pprint import pprint
-from typing import List, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 import asyncpg
 from asyncpg import Pool, UniqueViolationError
 from app.models import CounterpartyModel
+from config import settings
+
+# Колонки test.test_table в порядке записи
+COUNTERPARTY_COLUMNS = CounterpartyModel.DB_FIELDS + ("row_hash",)
+
+_UPDATE_SET = ",\n            ".join(f"{column} = EXCLUDED.{column}" for column in COUNTERPARTY_COLUMNS[1:])
+
+# SQL запрос с ON CONFLICT
+UPSERT_QUERY = """
+    INSERT INTO test.test_table (
+        id, opf, name, supplier_category, country, inn, tax_system,
+        reliability_level, edo_operator, contact_info, responsible_person,
+        comment, statutory_documents_link, ka_guarantee_letter,
+        reliability_update_date, card_details, record_sheet_passport,
+        oi_guarantee_letter, row_hash
+    ) VALUES (
+        $1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
+        $11, $12, $13, $14, $15, $16, $17, $18, $19
+    )
+    ON CONFLICT (id) DO UPDATE SET
+        opf = EXCLUDED.opf,
+        name = EXCLUDED.name,
+        supplier_category = EXCLUDED.supplier_category,
+        country = EXCLUDED.country,
+        inn = EXCLUDED.inn,
+        tax_system = EXCLUDED.tax_system,
+        reliability_level = EXCLUDED.reliability_level,
+        edo_operator = EXCLUDED.edo_operator,
+        contact_info = EXCLUDED.contact_info,
+        responsible_person = EXCLUDED.responsible_person,
+        comment = EXCLUDED.comment,
+        statutory_documents_link = EXCLUDED.statutory_documents_link,
+        ka_guarantee_letter = EXCLUDED.ka_guarantee_letter,
+        reliability_update_date = EXCLUDED.reliability_update_date,
+        card_details = EXCLUDED.card_details,
+        record_sheet_passport = EXCLUDED.record_sheet_passport,
+        oi_guarantee_letter = EXCLUDED.oi_guarantee_letter,
+        row_hash = EXCLUDED.row_hash
+    """
+ROW_HASHES_QUERY = "SELECT id, row_hash FROM test.test_table WHERE id = ANY($1::bigint[])"
 
 
 class GoogleSheetRepository:
+    # Горячие запросы: заносятся в кэш подготовленных запросов соединений пула при старте (warmup_pool)
+    HOT_STATEMENTS = (UPSERT_QUERY, ROW_HASHES_QUERY)
+
     def __init__(self, pool: Pool):
         self.pool = pool
 
     async def add_suppliers_data(self, data:List[CounterpartyModel]):
-        """Выполняет массовую вставку/обновление"""
-        records = []
-        for value in data:
-            records.append(
-                (
-                    value.id,
-                    value.opf,
-                    value.name,
-                    value.supplier_category,
-                    value.country,
-                    value.inn,
-                    value.tax_system,
-                    value.reliability_level,
-                    value.edo_operator,
-                    value.contact_info,
-                    value.responsible_person,
-                    value.comment,
-                    value.statutory_documents_link,
-                    value.ka_guarantee_letter,
-                    value.reliability_update_date,
-                    value.card_details,
-                    value.record_sheet_passport,
-                    value.oi_guarantee_letter
-                )
-            )
-        # SQL запрос с ON CONFLICT
-        query = """
-        INSERT INTO test.test_table (
-            id, opf, name, supplier_category, country, inn, tax_system,
-            reliability_level, edo_operator, contact_info, responsible_person,
-            comment, statutory_documents_link, ka_guarantee_letter,
-            reliability_update_date, card_details, record_sheet_passport,
-            oi_guarantee_letter
-        ) VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
-            $11, $12, $13, $14, $15, $16, $17, $18
-        )
-        ON CONFLICT (id) DO UPDATE SET
-            opf = EXCLUDED.opf,
-            name = EXCLUDED.name,
-            supplier_category = EXCLUDED.supplier_category,
-            country = EXCLUDED.country,
-            inn = EXCLUDED.inn,
-            tax_system = EXCLUDED.tax_system,
-            reliability_level = EXCLUDED.reliability_level,
-            edo_operator = EXCLUDED.edo_operator,
-            contact_info = EXCLUDED.contact_info,
-            responsible_person = EXCLUDED.responsible_person,
-            comment = EXCLUDED.comment,
-            statutory_documents_link = EXCLUDED.statutory_documents_link,
-            ka_guarantee_letter = EXCLUDED.ka_guarantee_letter,
-            reliability_update_date = EXCLUDED.reliability_update_date,
-            card_details = EXCLUDED.card_details,
-            record_sheet_passport = EXCLUDED.record_sheet_passport,
-            oi_guarantee_letter = EXCLUDED.oi_guarantee_letter
         """
+        Выполняет массовую вставку/обновление.
+
+        Небольшие пачки пишутся через executemany, начиная с settings.BULK_UPSERT_THRESHOLD
+        строк - через COPY во временную таблицу и один INSERT ... SELECT ... ON CONFLICT.
+        """
+        records = [value.db_values() + (value.fingerprint,) for value in data]
+        if len(records) >= settings.BULK_UPSERT_THRESHOLD:
+            await self._copy_upsert(records)
+            return
+
         # Используем executemany для массовой вставки
         async with self.pool.acquire() as conn:
-            await conn.executemany(query, records)
-    async def get_suppliers_data(self):
-        select_query = """
-            SELECT * from test.test_table;
+            await conn.executemany(UPSERT_QUERY, records)
+
+    async def _copy_upsert(self, records: List[Tuple]):
+        """
+        Bulk upsert: COPY во временную staging-таблицу и один set-based INSERT в одной транзакции.
+        """
+        # ON CONFLICT не может обновить одну строку дважды за запрос, поэтому
+        # оставляем последнюю запись для каждого id (как при построчном executemany)
+        records = list({record[0]: record for record in records}.values())
+        columns = ", ".join(COUNTERPARTY_COLUMNS)
+        upsert_query = f"""
+        INSERT INTO test.test_table ({columns})
+        SELECT {columns} FROM counterparty_staging
+        ON CONFLICT (id) DO UPDATE SET
+            {_UPDATE_SET}
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE counterparty_staging
+                    (LIKE test.test_table INCLUDING DEFAULTS)
+                    ON COMMIT DROP
+                """)
+                await conn.copy_records_to_table(
+                    "counterparty_staging", records=records, columns=COUNTERPARTY_COLUMNS
+                )
+                await conn.execute(upsert_query)
+
+    async def get_row_hashes(self, ids: List[int]) -> Dict[int, Optional[str]]:
+        """Возвращает отпечатки строк {id: row_hash} для переданных id."""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(ROW_HASHES_QUERY, ids)
+        return {row["id"]: row["row_hash"] for row in rows}
+
+    async def iter_suppliers_data(
+            self,
+            columns: Sequence[str],
+            batch_size: int = 2000,
+            changed_since: Optional[datetime.datetime] = None,
+            ids: Optional[Sequence[int]] = None,
+    ) -> AsyncIterator[List[asyncpg.Record]]:
         """
+        Потоково читает test.test_table серверным курсором, отдавая пачки записей
+        только с запрошенными колонками. С changed_since - только строки, измененные
+        позже этого момента (по updated_at), с ids - только строки с этими id.
+        """
+        unknown = set(columns) - set(COUNTERPARTY_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные колонки: {sorted(unknown)}")
+        conditions, args = [], []
+        if changed_since is not None:
+            args.append(changed_since)
+            conditions.append(f"updated_at > ${len(args)}")
+        if ids is not None:
+            args.append(list(ids))
+            conditions.append(f"id = ANY(${len(args)}::bigint[])")
+        query = f"SELECT {', '.join(columns)} FROM test.test_table"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id"
         async with self.pool.acquire() as conn:
-            result = await conn.fetch(select_query)
-        return result
\ No newline at end of file
+            # серверный курсор в asyncpg работает только внутри транзакции
+            async with conn.transaction():
+                cursor = await conn.cursor(query, *args)
+                while True:
+                    batch = await cursor.fetch(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+
+    async def get_export_horizon(self) -> datetime.datetime:
+        """
+        Граница инкрементальной выгрузки: все строки с updated_at раньше нее уже
+        зафиксированы и видны.
+
+        updated_at - время начала транзакции (now()), а зафиксироваться она может
+        намного позже, поэтому max(updated_at) границей быть не может. Граница -
+        начало самой старой открытой транзакции базы: все, что она и более поздние
+        транзакции изменят, получит updated_at не раньше нее.
+
+        Чужие сеансы видны в pg_stat_activity только роли с pg_read_all_stats (или
+        той же роли), поэтому запись в таблицу под другими ролями без этой
+        привилегии покрывает только settings.EXPORT_WATERMARK_OVERLAP.
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                SELECT least(now(), min(xact_start)) FROM pg_stat_activity
+                WHERE datname = current_database() AND backend_type = 'client backend'
+                """
+            )
+
+    async def get_export_watermark(self, spreadsheet: str, sheet: str) -> Optional[datetime.datetime]:
+        """Отметка выгрузки в лист: строки с updated_at до нее уже выгружены."""
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                SELECT exported_until FROM test.sheet_export_watermarks
+                WHERE spreadsheet = $1 AND sheet = $2
+                """,
+                spreadsheet, sheet,
+            )
+
+    async def set_export_watermark(self, spreadsheet: str, sheet: str, exported_until: datetime.datetime) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO test.sheet_export_watermarks (spreadsheet, sheet, exported_until)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (spreadsheet, sheet) DO UPDATE SET
+                    exported_until = EXCLUDED.exported_until,
+                    updated_at = now()
+                """,
+                spreadsheet, sheet, exported_until,
+            )
@@ -0,0 +1,142 @@
+from asyncpg import Pool
+
+
+def _create_trigger_if_missing(name: str, create_statement: str) -> str:
+    """
+    CREATE TRIGGER только если триггера test.test_table еще нет: DROP/CREATE TRIGGER
+    берут ACCESS EXCLUSIVE блокировку таблицы, и на каждом старте этого не нужно.
+    """
+    return f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger WHERE tgrelid = 'test.test_table'::regclass AND tgname = '{name}'
+        ) THEN
+            {create_statement.strip()};
+        END IF;
+    END
+    $$
+    """
+
+
+def _drop_trigger_if_exists(name: str) -> str:
+    """DROP TRIGGER только если триггер есть (DROP ... IF EXISTS блокирует таблицу и без него)."""
+    return f"""
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_trigger WHERE tgrelid = 'test.test_table'::regclass AND tgname = '{name}'
+        ) THEN
+            DROP TRIGGER {name} ON test.test_table;
+        END IF;
+    END
+    $$
+    """
+
+# Идемпотентные изменения схемы, которые выполняются при старте приложения
+SCHEMA_STATEMENTS = [
+    # Отпечаток содержимого строки для инкрементальной синхронизации лист -> БД
+    "ALTER TABLE test.test_table ADD COLUMN IF NOT EXISTS row_hash text",
+    # Журнал пачек записи в лист: позволяет продолжить запись с неприменной пачки
+    """
+    CREATE TABLE IF NOT EXISTS test.sheet_write_checkpoints (
+        spreadsheet text NOT NULL,
+        sheet text NOT NULL,
+        batch_no integer NOT NULL,
+        payload jsonb NOT NULL,
+        created_at timestamptz NOT NULL DEFAULT now(),
+        applied_at timestamptz,
+        PRIMARY KEY (spreadsheet, sheet, batch_no)
+    )
+    """,
+    # Время последнего изменения строки для инкрементальной выгрузки БД -> лист.
+    # Поддерживается триггером, поэтому учитываются изменения любым писателем
+    "ALTER TABLE test.test_table ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS test_table_updated_at_idx ON test.test_table (updated_at)",
+    """
+    CREATE OR REPLACE FUNCTION test.touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        -- upsert без фактических изменений не сдвигает updated_at
+        IF TG_OP = 'INSERT' OR NEW IS DISTINCT FROM OLD THEN
+            NEW.updated_at := now();
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    _create_trigger_if_missing(
+        "test_table_touch_updated_at",
+        """
+        CREATE TRIGGER test_table_touch_updated_at
+        BEFORE INSERT OR UPDATE ON test.test_table
+        FOR EACH ROW EXECUTE FUNCTION test.touch_updated_at()
+        """,
+    ),
+    # Отметка выгрузки БД -> лист: до какого updated_at строки уже выгружены в лист
+    """
+    CREATE TABLE IF NOT EXISTS test.sheet_export_watermarks (
+        spreadsheet text NOT NULL,
+        sheet text NOT NULL,
+        exported_until timestamptz NOT NULL,
+        updated_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (spreadsheet, sheet)
+    )
+    """,
+]
+
+# Уведомления об измененных строках для фоновой отправки в лист (SheetPushWorker):
+# payload - id строки, изменения без фактической разницы не уведомляются.
+# Триггеры уровня оператора: функция вызывается один раз на INSERT/UPDATE
+# (в том числе на пачку upsert), а не на каждую строку. Ставятся только при
+# включенной отправке; после ее отключения триггеры удаляются вручную - другой
+# экземпляр сервиса может по-прежнему их использовать
+NOTIFY_STATEMENTS = [
+    # строчный триггер прежней версии
+    _drop_trigger_if_exists("test_table_notify_change"),
+    """
+    CREATE OR REPLACE FUNCTION test.notify_test_table_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM pg_notify('test_table_changes', n.id::text) FROM new_rows n;
+        ELSE
+            PERFORM pg_notify('test_table_changes', n.id::text)
+            FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n IS DISTINCT FROM o;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # у триггера с таблицами переходов может быть только одно событие
+    _create_trigger_if_missing(
+        "test_table_notify_insert",
+        """
+        CREATE TRIGGER test_table_notify_insert
+        AFTER INSERT ON test.test_table REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION test.notify_test_table_change()
+        """,
+    ),
+    _create_trigger_if_missing(
+        "test_table_notify_update",
+        """
+        CREATE TRIGGER test_table_notify_update
+        AFTER UPDATE ON test.test_table REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION test.notify_test_table_change()
+        """,
+    ),
+]
+
+# Канал LISTEN/NOTIFY с id измененных строк test.test_table
+CHANGES_CHANNEL = "test_table_changes"
+
+
+async def apply_schema(pool: Pool, notify_changes: bool = False) -> None:
+    """
+    Применяет SCHEMA_STATEMENTS в одной транзакции, с notify_changes - и
+    NOTIFY_STATEMENTS (триггеры уведомлений для SheetPushWorker).
+    """
+    statements = SCHEMA_STATEMENTS + NOTIFY_STATEMENTS if notify_changes else SCHEMA_STATEMENTS
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            for statement in statements:
+                await conn.execute(statement)
@@ -1,5 +1,8 @@
-from .googlesheet import get_googlesheet_service
+from .googlesheet import get_counterparty_cache, get_googlesheet_repository, get_googlesheet_service, get_sync_job_manager
 
 __all__ = [
-    'get_googlesheet_service'
+    'get_counterparty_cache',
+    'get_googlesheet_repository',
+    'get_googlesheet_service',
+    'get_sync_job_manager'
 ]
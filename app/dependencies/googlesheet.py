@@ -2,7 +2,10 @@ from asyncpg import Pool
 from fastapi import Depends
 from starlette.requests import Request
 
+from app.infrastructure.counterparty_cache import CounterpartyCache
 from app.service.googlesheet import GoogleSheetService
+from app.service.jobs import SyncJobManager
+from app.database.repositories.checkpoints import SheetCheckpointRepository
 from app.database.repositories.googlesheet import GoogleSheetRepository
 
 
@@ -15,5 +18,23 @@ def get_googlesheet_repository(pool: Pool = Depends(get_pool)) -> GoogleSheetRep
     return GoogleSheetRepository(pool)
 
 
-def get_googlesheet_service(repository: GoogleSheetRepository = Depends(get_googlesheet_repository)) -> GoogleSheetService:
-    return GoogleSheetService(repository)
+def get_checkpoint_repository(pool: Pool = Depends(get_pool)) -> SheetCheckpointRepository:
+    return SheetCheckpointRepository(pool)
+
+
+def get_counterparty_cache(request: Request) -> CounterpartyCache:
+    """Кэш контрагентов для API чтения из состояния приложения."""
+    return request.app.state.counterparty_cache
+
+
+def get_googlesheet_service(
+        repository: GoogleSheetRepository = Depends(get_googlesheet_repository),
+        checkpoint_repository: SheetCheckpointRepository = Depends(get_checkpoint_repository),
+        counterparty_cache: CounterpartyCache = Depends(get_counterparty_cache),
+) -> GoogleSheetService:
+    return GoogleSheetService(repository, checkpoint_repository, counterparty_cache)
+
+
+def get_sync_job_manager(request: Request) -> SyncJobManager:
+    """Менеджер фоновых задач синхронизации из состояния приложения."""
+    return request.app.state.sync_jobs
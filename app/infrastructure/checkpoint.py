@@ -0,0 +1,54 @@
+import copy
+import itertools
+from typing import Dict, List, Tuple
+
+# Ключ журнала записи - лист: (spreadsheet, sheet)
+CheckpointKey = Tuple[str, str]
+
+
+class MemoryCheckpointStore:
+    """
+    Журнал пачек записи в лист в памяти процесса.
+
+    Пачка добавляется в журнал до отправки и отмечается примененной после
+    успешного batch_update, поэтому после ошибки запись продолжается с первой
+    неприменной пачки. Тот же интерфейс у SheetCheckpointRepository (журнал в БД),
+    который переживает перезапуск сервиса.
+
+    Как и у журнала в БД, пачки хранятся и отдаются копиями: gspread меняет
+    переданные в batch_update диапазоны на месте, и журнал не должен делить
+    с вызовом API одни и те же объекты.
+    """
+
+    def __init__(self):
+        self._batches: Dict[CheckpointKey, Dict[int, dict]] = {}
+        self._applied: Dict[CheckpointKey, set] = {}
+        self._numbers = itertools.count(1)
+
+    async def add(self, key: CheckpointKey, payload: dict) -> int:
+        batch_no = next(self._numbers)
+        self._batches.setdefault(key, {})[batch_no] = copy.deepcopy(payload)
+        return batch_no
+
+    async def pending(self, key: CheckpointKey) -> List[Tuple[int, dict]]:
+        applied = self._applied.get(key, set())
+        return [
+            (batch_no, copy.deepcopy(payload))
+            for batch_no, payload in sorted(self._batches.get(key, {}).items())
+            if batch_no not in applied
+        ]
+
+    async def mark_applied(self, key: CheckpointKey, batch_no: int) -> None:
+        self._applied.setdefault(key, set()).add(batch_no)
+
+    async def clear(self, key: CheckpointKey) -> None:
+        """Удаляет из журнала примененные пачки листа."""
+        applied = self._applied.pop(key, set())
+        batches = self._batches.get(key, {})
+        for batch_no in applied:
+            batches.pop(batch_no, None)
+        if not batches:
+            self._batches.pop(key, None)
+
+
+memory_checkpoints = MemoryCheckpointStore()
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from app.models import CounterpartyModel
+from app.infrastructure.metrics import DB_ROWS
+
+try:
+    # быстрая сериализация, если установлен orjson; иначе стандартный json
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def make_etag(*parts: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part)
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (список значений, "*" и слабые W/ теги)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CounterpartySnapshot:
+    """
+    Неизменяемый снимок test.test_table для чтения: JSON каждой строки
+    сериализован заранее, индексы id -> строка и ИНН -> строки.
+    """
+
+    def __init__(self, rows: List[Tuple[int, Optional[str], bytes]]):
+        # rows: (id, ИНН, JSON строки) в порядке id
+        self.by_id: Dict[int, Tuple[bytes, str]] = {}
+        self.by_inn: Dict[str, List[bytes]] = {}
+        for row_id, inn, body in rows:
+            self.by_id[row_id] = (body, make_etag(body))
+            if inn:
+                self.by_inn.setdefault(inn.strip(), []).append(body)
+        self.list_body = b"[" + b",".join(body for _, _, body in rows) + b"]"
+        self.etag = make_etag(self.list_body)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+
+class CounterpartyCache:
+    """
+    Кэш контрагентов в памяти процесса для API чтения.
+
+    Запросы обслуживаются из снимка без обращения к БД. Снимок перечитывается
+    после синхронизации лист -> БД с изменениями и в фоне, если он старше ttl
+    (до завершения перечитывания отдается прежний).
+    """
+
+    def __init__(self, ttl: float = 300.0, batch_size: int = 2000):
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.snapshot: Optional[CounterpartySnapshot] = None
+        self._lock = asyncio.Lock()
+        self._background: Optional[asyncio.Task] = None
+
+    async def refresh(self, repository) -> CounterpartySnapshot:
+        """Перечитывает test.test_table; одновременные вызовы выполняют одно чтение."""
+        requested = time.monotonic()
+        async with self._lock:
+            if self.snapshot is not None and self.snapshot.loaded_at >= requested:
+                # пока ждали блокировку, снимок уже перечитали
+                return self.snapshot
+            fields = list(CounterpartyModel.DB_FIELDS)
+            inn_pos = fields.index("inn")
+            rows = []
+            async for batch in repository.iter_suppliers_data(fields, batch_size=self.batch_size):
+                DB_ROWS.labels("read").inc(len(batch))
+                for record in batch:
+                    values = tuple(record)
+                    rows.append((values[0], values[inn_pos], dumps_json(dict(zip(fields, values)))))
+            self.snapshot = CounterpartySnapshot(rows)
+            print(f"Кэш контрагентов обновлен: {len(self.snapshot)} записей")
+            return self.snapshot
+
+    async def get(self, repository) -> CounterpartySnapshot:
+        """Текущий снимок; при первом обращении загружается, устаревший обновляется в фоне."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return await self.refresh(repository)
+        if time.monotonic() - snapshot.loaded_at > self.ttl and (
+                self._background is None or self._background.done()
+        ):
+            self._background = asyncio.create_task(self._refresh_quietly(repository))
+        return snapshot
+
+    async def _refresh_quietly(self, repository) -> None:
+        try:
+            await self.refresh(repository)
+        except Exception as e:
+            print(f"Не удалось обновить кэш контрагентов: {type(e).__name__}: {e}")
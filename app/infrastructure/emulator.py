@@ -0,0 +1,324 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+import gspread
+import requests
+from gspread.utils import absolute_range_name, numericise_all
+
+from config import settings
+
+_A1_CELL = re.compile(r"^([A-Z]+)(\d+)$")
+_A1_ROWS = re.compile(r"^(\d+):(\d+)$")
+
+
+def parse_a1_cell(cell: str):
+    """'B12' -> (12, 2), нумерация с 1"""
+    match = _A1_CELL.match(cell)
+    if match is None:
+        raise ValueError(f"Неподдерживаемая ссылка на ячейку: {cell}")
+    letters, row = match.group(1), int(match.group(2))
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - 64
+    return row, col
+
+
+def _api_error(code: int, message: str, retry_after: Optional[float] = None) -> gspread.exceptions.APIError:
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({"error": {"code": code, "message": message, "status": "RESOURCE_EXHAUSTED"}}).encode()
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return gspread.exceptions.APIError(response)
+
+
+class SheetsEmulator:
+    """
+    Локальный эмулятор Google Sheets для нагрузочных тестов и бенчмарков.
+
+    Поддерживает используемую сервисом часть API gspread (open, open_by_key, worksheet,
+    get_all_values, get_all_records, row_values, batch_get, update, batch_update, add_rows,
+    append_rows),
+    задержку на каждый вызов, случайные ответы 429, поминутную квоту и учет запросов.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            quota_per_minute: int = 0,
+            retry_after: Optional[float] = None,
+            autocreate: bool = True,
+            seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self.retry_after = retry_after
+        self.autocreate = autocreate
+        self.calls = Counter()
+        self.rejected = Counter()
+        self._random = random.Random(seed)
+        self._window = deque()
+        self._lock = threading.Lock()
+        self.spreadsheets: Dict[str, "EmulatedSpreadsheet"] = {}
+
+    def request(self, method: str) -> None:
+        """Учет вызова API: задержка, квота и инъекция 429."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            now = time.monotonic()
+            if self.quota_per_minute:
+                while self._window and self._window[0] <= now - 60:
+                    self._window.popleft()
+                if len(self._window) >= self.quota_per_minute:
+                    self.rejected[method] += 1
+                    retry_after = self.retry_after if self.retry_after is not None else 60 - (now - self._window[0])
+                    raise _api_error(429, "Quota exceeded (emulator)", retry_after)
+                self._window.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.rejected[method] += 1
+                raise _api_error(429, "Injected quota error (emulator)", self.retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "total_calls": sum(self.calls.values()),
+            "rejected": dict(self.rejected),
+            "total_rejected": sum(self.rejected.values()),
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.rejected.clear()
+            self._window.clear()
+
+    def add_worksheet(self, spreadsheet: str, sheet: str, rows: List[List[str]]) -> "EmulatedWorksheet":
+        """Создает (или перезаписывает) лист с данными - для подготовки сценария."""
+        handle = self.spreadsheets.get(spreadsheet)
+        if handle is None:
+            handle = self.spreadsheets[spreadsheet] = EmulatedSpreadsheet(self, spreadsheet)
+        worksheet = EmulatedWorksheet(rows, title=sheet, emulator=self)
+        handle.sheets[sheet] = worksheet
+        return worksheet
+
+    def load(self, path: str) -> None:
+        """Загружает данные из JSON вида {таблица: {лист: [[...], ...]}}."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for spreadsheet, sheets in data.items():
+            for sheet, rows in sheets.items():
+                self.add_worksheet(spreadsheet, sheet, rows)
+
+    def client(self) -> "EmulatedClient":
+        return EmulatedClient(self)
+
+
+class EmulatedClient:
+    def __init__(self, emulator: SheetsEmulator):
+        self.emulator = emulator
+
+    def open(self, title: str) -> "EmulatedSpreadsheet":
+        self.emulator.request("open")
+        handle = self.emulator.spreadsheets.get(title)
+        if handle is None:
+            if not self.emulator.autocreate:
+                raise gspread.exceptions.SpreadsheetNotFound(title)
+            handle = self.emulator.spreadsheets[title] = EmulatedSpreadsheet(self.emulator, title)
+        return handle
+
+    def open_by_key(self, key: str) -> "EmulatedSpreadsheet":
+        self.emulator.request("open_by_key")
+        for handle in self.emulator.spreadsheets.values():
+            if handle.id == key:
+                return handle
+        raise gspread.exceptions.SpreadsheetNotFound(key)
+
+
+class EmulatedSpreadsheet:
+    def __init__(self, emulator: SheetsEmulator, title: str):
+        self.emulator = emulator
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.sheets: Dict[str, EmulatedWorksheet] = {}
+
+    def worksheet(self, title: str) -> "EmulatedWorksheet":
+        self.emulator.request("worksheet")
+        sheet = self.sheets.get(title)
+        if sheet is None:
+            if not self.emulator.autocreate:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            sheet = self.sheets[title] = EmulatedWorksheet([], title=title, emulator=self.emulator)
+        return sheet
+
+
+class EmulatedWorksheet:
+    """
+    In-memory лист: значения хранятся строками, как их отдает get_all_values.
+
+    Может использоваться и без эмулятора (emulator=None) - тогда ведется только
+    счетчик вызовов calls, без задержек и ошибок.
+    """
+
+    def __init__(self, rows: List[List[str]], title: str = "Лист1", emulator: Optional[SheetsEmulator] = None):
+        self.title = title
+        self.emulator = emulator
+        self.rows = [list(row) for row in rows]
+        self.calls = Counter()
+        # число ячеек, отданных запросами чтения и переданных запросами записи
+        self.cells_read = 0
+        self.cells_written = 0
+        self._lock = threading.Lock()
+
+    def _request(self, method: str) -> None:
+        self.calls[method] += 1
+        if self.emulator is not None:
+            self.emulator.request(method)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    @property
+    def col_count(self) -> int:
+        return max((len(row) for row in self.rows), default=0)
+
+    @staticmethod
+    def _cell_value(value) -> str:
+        return "" if value is None else str(value)
+
+    def _set(self, row: int, col: int, value) -> None:
+        while len(self.rows) < row:
+            self.rows.append([])
+        current = self.rows[row - 1]
+        while len(current) < col:
+            current.append("")
+        current[col - 1] = self._cell_value(value)
+
+    def _write_range(self, range_name: str, values) -> None:
+        start_row, start_col = parse_a1_cell(range_name.split(":")[0])
+        self.cells_written += sum(len(row_values) for row_values in values)
+        for row_offset, row_values in enumerate(values):
+            for col_offset, value in enumerate(row_values):
+                self._set(start_row + row_offset, start_col + col_offset, value)
+
+    def get_all_values(self, **kwargs):
+        self._request("get_all_values")
+        with self._lock:
+            width = self.col_count
+            self.cells_read += width * len(self.rows)
+            return [row + [""] * (width - len(row)) for row in self.rows]
+
+    def get_all_records(self, expected_headers=None, **kwargs):
+        """Как в gspread: числа в значениях преобразуются в int/float."""
+        self._request("get_all_records")
+        with self._lock:
+            if not self.rows:
+                return []
+            headers = self.rows[0]
+            self.cells_read += len(headers) * len(self.rows)
+            return [
+                dict(zip(headers, numericise_all(
+                    [row[idx] if idx < len(row) else "" for idx in range(len(headers))],
+                    default_blank="",
+                )))
+                for row in self.rows[1:]
+            ]
+
+    def row_values(self, row: int, **kwargs):
+        self._request("row_values")
+        with self._lock:
+            values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        while values and values[-1] == "":
+            values.pop()
+        self.cells_read += len(values)
+        return values
+
+    def _read_range(self, range_name: str) -> List[List[str]]:
+        """Значения диапазона 'A2:C10' или '1:1'; как в API, пустые хвосты строк и диапазона отбрасываются."""
+        rows_match = _A1_ROWS.match(range_name)
+        if rows_match is not None:
+            start_row, end_row = int(rows_match.group(1)), int(rows_match.group(2))
+            start_col, end_col = 1, None
+        else:
+            start, _, end = range_name.partition(":")
+            start_row, start_col = parse_a1_cell(start)
+            end_row, end_col = parse_a1_cell(end or start)
+        values = []
+        for row in self.rows[start_row - 1:end_row]:
+            part = row[start_col - 1:end_col]
+            while part and part[-1] == "":
+                part = part[:-1]
+            values.append(part)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def batch_get(self, ranges, **kwargs):
+        self._request("batch_get")
+        with self._lock:
+            result = [self._read_range(range_name) for range_name in ranges]
+            self.cells_read += sum(len(row) for values in result for row in values)
+        return result
+
+    def update(self, range_name, values=None, **kwargs):
+        self._request("update")
+        with self._lock:
+            self._write_range(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        # как gspread: имя листа дописывается к data[i]["range"] на месте, до запроса
+        for item in data:
+            item["range"] = absolute_range_name(self.title, item["range"])
+        self._request("batch_update")
+        with self._lock:
+            ranges = [self._sheet_range(item["range"]) for item in data]
+            for range_name, item in zip(ranges, data):
+                self._write_range(range_name, item["values"])
+
+    def _sheet_range(self, range_name: str) -> str:
+        """"'Лист1'!B2:C3" -> "B2:C3"; диапазон с повторным именем листа API не разбирает (400)."""
+        prefix = absolute_range_name(self.title) + "!"
+        local = range_name[len(prefix):] if range_name.startswith(prefix) else range_name
+        if "!" in local:
+            raise _api_error(400, f"Unable to parse range: {range_name}")
+        return local
+
+    def add_rows(self, rows: int):
+        self._request("add_rows")
+        with self._lock:
+            self.rows.extend([] for _ in range(rows))
+
+    def append_rows(self, values, **kwargs):
+        self._request("append_rows")
+        with self._lock:
+            for row in values:
+                self.rows.append([self._cell_value(value) for value in row])
+                self.cells_written += len(row)
+
+
+_emulator: Optional[SheetsEmulator] = None
+
+
+def get_emulator() -> SheetsEmulator:
+    """Общий эмулятор процесса, настроенный из settings (GS_BACKEND=emulator)."""
+    global _emulator
+    if _emulator is None:
+        _emulator = SheetsEmulator(
+            latency=settings.GS_EMULATOR_LATENCY,
+            error_rate=settings.GS_EMULATOR_ERROR_RATE,
+            quota_per_minute=settings.GS_EMULATOR_QUOTA_PER_MINUTE,
+            retry_after=settings.GS_EMULATOR_RETRY_AFTER,
+        )
+        if settings.GS_EMULATOR_DATA:
+            _emulator.load(settings.GS_EMULATOR_DATA)
+    return _emulator
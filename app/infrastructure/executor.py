@@ -0,0 +1,45 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from config import settings
+
+# Общий ограниченный пул потоков для блокирующих вызовов gspread,
+# чтобы сетевые запросы к Google не останавливали event loop
+_executor = ThreadPoolExecutor(max_workers=settings.GS_MAX_WORKERS, thread_name_prefix="gsheet")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Выполняет блокирующую функцию в пуле потоков gspread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+# Пул процессов для CPU-нагруженной проверки строк; создается при первом использовании
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: форк процесса с потоками gspread и соединениями asyncpg небезопасен
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.VALIDATION_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+async def run_in_process(func, *args):
+    """Выполняет функцию (должна быть доступна по импорту) в пуле процессов."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
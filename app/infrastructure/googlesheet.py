@@ -1,141 +1,237 @@
 import asyncio
-import time
 from datetime import datetime
-
-import pandas
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple
 
 import gspread
-import requests
-from gspread import Client, service_account
-import pandas as pd
-
-
-def column_index_to_letter(index):
-    letter = ''
-    while index > 0:
-        index -= 1
-        letter = chr((index % 26) + 65) + letter
-        index //= 26
-    return letter
-
-def retry_on_quota_exceeded(max_retries=10, delay=60):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            retries = 0
-            while retries < max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except gspread.exceptions.APIError as e:
-                    print(f"Error: {e} | time sleep 60 sec [сработал декоратор]")
-                    time.sleep(delay)
-                    retries += 1
-            print("Не удалось выполнить операцию после нескольких попыток.")
-            raise Exception("Не удалось выполнить операцию после нескольких попыток.")
-
-        return wrapper
-
-    return decorator
-
-
-def retry_on_quota_exceeded_async(max_retries=10, delay=60):
-    def decorator(func):
-        async def async_wrapper(*args, **kwargs):
-            retries = 0
-            while retries < max_retries:
-                try:
-                    return await func(*args, **kwargs)
-                except gspread.exceptions.APIError as e:
-                    print(f"Error: {e} | Async sleep {delay} sec [сработал декоратор]")
-                    await asyncio.sleep(delay)
-                    retries += 1
-            print("Не удалось выполнить операцию после нескольких попыток.")
-            raise Exception("Не удалось выполнить операцию после нескольких попыток.")
-
-        return async_wrapper
-
-    return decorator
+from gspread import Client
+
+from app.infrastructure.checkpoint import memory_checkpoints
+from app.infrastructure.metrics import SHEET_CELLS, SHEET_ROWS, count_cells, track_stage
+from app.infrastructure.rate_limit import SheetsRateLimiter, is_grid_limit_error, is_retryable
+from app.infrastructure.registry import SheetRegistry, sheet_registry
+from app.infrastructure.sheet_keys import SheetKeyIndex, normalize_key
+from app.infrastructure.sheet_writer import a1_range, chunk_updates, coalesce_cells
+from config import settings
+
+
+def _column_runs(positions: List[Optional[int]]) -> List[Tuple[int, int]]:
+    """Индексы колонок (с нуля) -> отрезки подряд идущих колонок [(первая, последняя), ...]"""
+    runs = []
+    for position in sorted({p for p in positions if p is not None}):
+        if runs and runs[-1][1] == position - 1:
+            runs[-1] = (runs[-1][0], position)
+        else:
+            runs.append((position, position))
+    return runs
+
+
+def _trim_row(row: list) -> list:
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
 
 
 class PCGoogleSheet:
-    def __init__(self, spreadsheet: str, sheet: str, creds_json='creds.json'):
+    """
+    Асинхронный клиент Google Sheets.
+
+    Все сетевые вызовы gspread выполняются в пуле потоков через общий ограничитель
+    запросов (квоты, повторы с backoff). Экземпляр создается через
+    PCGoogleSheet.create(...), который выполняет подключение к листу.
+    """
+
+    def __init__(
+            self,
+            spreadsheet: str,
+            sheet: str,
+            creds_json='creds.json',
+            registry: SheetRegistry = sheet_registry,
+    ):
         self.creds_json = creds_json
         self.spreadsheet = spreadsheet
-        self.client = self.client_init_json()
-        self.sheet = self.connect_to_sheet(sheet)
+        self.sheet_name = sheet
+        self.registry = registry
+        self.limiter: SheetsRateLimiter = registry.limiter
+        self.client: Client | None = None
+        self.sheet: gspread.Worksheet | None = None
+
+    @classmethod
+    async def create(
+            cls,
+            spreadsheet: str,
+            sheet: str,
+            creds_json='creds.json',
+            registry: SheetRegistry = sheet_registry,
+    ) -> "PCGoogleSheet":
+        """Подключается к листу через общий реестр, не блокируя event loop."""
+        instance = cls(spreadsheet=spreadsheet, sheet=sheet, creds_json=creds_json, registry=registry)
+        instance.client = await registry.get_client(creds_json)
+        instance.sheet = await instance.connect_to_sheet(sheet)
+        return instance
+
+    @property
+    def cache_key(self):
+        return self.creds_json, self.spreadsheet, self.sheet_name
+
+    async def connect_to_sheet(self, sheet: str):
+        """Подключение к листу; повторы при временных ошибках выполняет ограничитель запросов."""
+        try:
+            return await self.registry.get_worksheet(self.creds_json, self.spreadsheet, sheet)
+        except Exception as e:
+            print(f"Не удалось подключиться к Google Sheets: {e} | Время: {datetime.now()}")
+            # сбрасываем возможно устаревший дескриптор листа
+            self.registry.invalidate(self.creds_json, self.spreadsheet, sheet)
+            raise
 
-    def client_init_json(self) -> Client:
-        """Создание клиента для работы с Google Sheets."""
-        return service_account(filename=self.creds_json)
+    async def _refresh_sheet(self) -> None:
+        """Обновляет дескриптор листа: размер сетки в кэше реестра мог устареть."""
+        self.sheet = await self.registry.refresh_worksheet(self.creds_json, self.spreadsheet, self.sheet_name)
 
-    def connect_to_sheet(self, sheet: str):
-        """Попытка подключения к Google Sheets с повторными попытками в случае ошибки."""
-        for _ in range(10):
-            try:
-                spreadsheet = self.client.open(self.spreadsheet)
-                return spreadsheet.worksheet(sheet)
-            except (gspread.exceptions.APIError, requests.exceptions.ConnectionError) as e:
-                print(f"Error: {e} | Время: {datetime.now()} | Time sleep: 60 sec")
-                time.sleep(60)
-        print("Не удалось подключиться к Google Sheets после 10 попыток.")
-        raise Exception("Не удалось подключиться к Google Sheets после 10 попыток.")
-
-    def add_suppliers_data(self):
-        pass
-
-    def get_suppliers_data(self) -> pd.DataFrame:
-        """
-        Получает все данные из таблицы поставщиков и преобразует в DataFrame.
+    async def _read(self, func, *args, **kwargs):
+        """Запрос на чтение через общий ограничитель запросов."""
+        return await self.limiter.call("read", func, *args, **kwargs)
 
-        Предполагается, что заголовки столбцов находятся в первой строке.
-        Возвращает:
-            DataFrame с данными поставщиков
-        """
-        try:
-            # Получаем все значения из листа
-            all_data = self.sheet.get_all_values()
+    async def _write(self, func, *args, **kwargs):
+        """Запрос на запись через общий ограничитель запросов."""
+        return await self.limiter.call("write", func, *args, **kwargs)
 
-            if not all_data or len(all_data) < 2:  # Проверяем, есть ли данные
-                print("Таблица пуста или содержит только заголовки")
-                return pd.DataFrame()
+    async def _batch_update(self, updates: List[dict], **kwargs):
+        """
+        batch_update через ограничитель запросов. gspread дописывает имя листа к
+        update["range"] на месте, поэтому каждая попытка (в том числе повтор после
+        429/5xx) отправляет свои копии, а переданные updates не меняются.
+        """
+        sheet = self.sheet
 
-            # Первая строка - заголовки
-            headers = all_data[0]
+        def batch_update():
+            return sheet.batch_update([dict(update) for update in updates], **kwargs)
 
-            # Остальные строки - данные
-            data_rows = all_data[1:]
+        return await self._write(batch_update)
 
-            # Создаем DataFrame
-            df = pd.DataFrame(data_rows, columns=headers)
+    async def get_headers(self, refresh: bool = False) -> tuple[list, dict]:
+        """
+        Заголовки листа из кэша реестра: (список заголовков, карта заголовок -> индекс с нуля).
+        """
+        if refresh:
+            self.registry.invalidate_headers(self.cache_key)
+        return await self.registry.get_headers(self.cache_key, self.sheet)
+
+    async def read_columns(
+            self,
+            columns: List[str],
+            page_rows: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[int, List[List[str]]]]:
+        """
+        Постраничное чтение только нужных колонок листа через batch_get.
 
-            # Убираем пустые строки (если все значения NaN)
-            df = df.dropna(how='all')
+        Заголовки берутся из кэша реестра и сверяются с первой строкой листа, которая
+        запрашивается вместе с первой страницей. Страница - окно из page_rows строк,
+        колонки запрашиваются диапазонами из подряд идущих колонок.
 
-            # Преобразуем названия столбцов в более удобный формат (опционально)
-            # df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+        Yields:
+            (номер первой строки страницы, строки) - значения в порядке columns,
+            '' для пустых ячеек и колонок, которых нет в листе
+        """
+        page_rows = page_rows or settings.GS_READ_PAGE_ROWS
+        headers, header_map = await self.get_headers()
+        check_headers = True
+        # число строк сетки после обновления дескриптора листа из-за ошибки "exceeds grid limits"
+        grid_rows = None
+        start = 2
+        while True:
+            positions = [header_map.get(column) for column in columns]
+            runs = _column_runs(positions)
+            end = start + page_rows - 1
+            if grid_rows is not None:
+                if start > grid_rows:
+                    return
+                end = min(end, grid_rows)
+            ranges = [a1_range(start, first + 1, end, last + 1) for first, last in runs]
+            if check_headers:
+                ranges.insert(0, "1:1")
+            elif not ranges:
+                return
 
-            print(f"Получено {len(df)} записей из Google Sheets")
-            return df
+            try:
+                result = await self._read(self.sheet.batch_get, ranges)
+            except Exception as e:
+                if grid_rows is not None or not is_grid_limit_error(e):
+                    raise
+                # сетку листа уменьшили - читаем страницу заново в ее пределах
+                await self._refresh_sheet()
+                grid_rows = self.sheet.row_count
+                continue
+            if check_headers:
+                check_headers = False
+                header_row = _trim_row(result[0][0]) if result[0] else []
+                result = result[1:]
+                if header_row != _trim_row(headers):
+                    # заголовки изменились с момента кэширования - перечитываем страницу по новым
+                    headers, header_map = self.registry.set_headers(self.cache_key, header_row)
+                    continue
+                if not runs:
+                    return
+
+            # строка страницы собирается из диапазонов, дополненных до их ширины, и в конце
+            # пустой ячейки для отсутствующих колонок; нужные значения выбираются по индексам
+            widths = [last - first + 1 for first, last in runs]
+            offsets = {}
+            flat_width = 0
+            for (first, last), width in zip(runs, widths):
+                for position in range(first, last + 1):
+                    offsets[position] = flat_width + position - first
+                flat_width += width
+            picks = [flat_width if position is None else offsets[position] for position in positions]
+
+            height = max((len(values) for values in result), default=0)
+            rows = []
+            for i in range(height):
+                flat = []
+                for values, width in zip(result, widths):
+                    part = values[i] if i < len(values) else ()
+                    flat.extend(part)
+                    if len(part) < width:
+                        flat.extend([''] * (width - len(part)))
+                flat.append('')
+                rows.append([flat[pick] for pick in picks])
+            SHEET_ROWS.labels("read").inc(height)
+            SHEET_CELLS.labels("read").inc(height * len(columns))
+
+            if rows:
+                yield start, rows
+            # страница неполная и дальше сетки листа нет - данные закончились
+            if height < end - start + 1 and end >= self.sheet.row_count:
+                return
+            start = end + 1
 
-        except Exception as e:
-            print(f"Ошибка при получении данных: {e}")
-            raise
+    async def iter_suppliers_data(
+            self,
+            columns: List[str],
+            page_rows: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[int, List[List[str]]]]:
+        """
+        Данные поставщиков окнами строк: страницы read_columns
+        (номер первой строки, строки со значениями в порядке columns).
+        """
+        pages = self.read_columns(columns, page_rows)
+        while True:
+            with track_stage("sheet_to_db", "sheet_fetch"):
+                page = await anext(pages, None)
+            if page is None:
+                return
+            yield page
 
-    @staticmethod
-    def get_column_letter(col_idx: int) -> str:
-        """Конвертирует индекс колонки в букву (A, B, C, ...)"""
-        result = ""
-        while col_idx > 0:
-            col_idx, remainder = divmod(col_idx - 1, 26)
-            result = chr(65 + remainder) + result
-        return result
-
-    def insert_data_correct(self, data_dict: dict, sheet_header="id") -> None:
+    async def insert_data_correct(self, data_dict: dict, sheet_header="id") -> None:
         """
-        Оптимизированная версия - обновляет данные целыми столбцами.
+        Обновляет значения {ключ: {заголовок: значение}} в строках с этими ключами.
+
+        Из листа читаются только ключевая и целевые колонки; записываются только
+        ячейки, значения которых отличаются от прочитанных.
         """
         try:
             # Получаем заголовки таблицы
-            headers = self.sheet.row_values(1)
+            headers, header_map = await self.get_headers()
             # print(headers)
             # Находим индекс колонки wild
             wild_col_idx = None
@@ -155,11 +251,15 @@ class PCGoogleSheet:
             target_headers = list(set().union(*(item.keys() for item in data_dict.values())))
             print(f"Все целевые заголовки: {target_headers}")
 
+            if any(header not in header_map for header in target_headers):
+                # заголовки могли измениться с момента кэширования
+                headers, header_map = await self.get_headers(refresh=True)
+
             target_indices = []
 
             for header in target_headers:
-                if header in headers:
-                    target_indices.append(headers.index(header))
+                if header in header_map:
+                    target_indices.append(header_map[header])
 
             if not target_indices:
                 # logger.error("Целевые заголовки не найдены в таблице")
@@ -167,104 +267,49 @@ class PCGoogleSheet:
 
                 return
 
-            # Сортируем индексы и проверяем, что они идут подряд
             target_indices.sort()
-            is_consecutive = all(target_indices[i] + 1 == target_indices[i + 1]
-                                 for i in range(len(target_indices) - 1))
-
-            # Получаем все данные таблицы
-            all_data = self.sheet.get_all_values()
-
-            # Создаем матрицу для обновления (строки x колонки)
-            updates = []
-
-            if is_consecutive and len(target_indices) > 1:
-                # ОПТИМИЗАЦИЯ: обновляем целым диапазоном столбцов
-                start_col = target_indices[0]
-                end_col = target_indices[-1]
-
-                # ПРАВИЛЬНО формируем диапазон: "AX2:BA5886"
-                start_col_letter = self.get_column_letter(start_col + 1)
-                end_col_letter = self.get_column_letter(end_col + 1)
-                update_range = f"{start_col_letter}2:{end_col_letter}{len(all_data)}"
-
-                # logger.info(f"Обновляем диапазон: {update_range}")
-                print(f"Обновляем диапазон: {update_range}")
-
-                # Создаем матрицу обновлений
-                update_matrix = [['' for _ in range(len(target_indices))] for _ in range(len(all_data) - 1)]
-
-                # Заполняем матрицу данными
-                for row_idx in range(1, len(all_data)):
-                    row = all_data[row_idx]
-                    if len(row) > wild_col_idx:
-                        current_wild = row[wild_col_idx]
-                        if current_wild in data_dict:
-                            wild_data = data_dict[current_wild]
-                            for i, col_idx in enumerate(target_indices):
-                                header = headers[col_idx]
-                                if header in wild_data:
-                                    update_matrix[row_idx - 1][i] = wild_data[header]
-                                else:
-                                    # Сохраняем оригинальное значение если нет в словаре
-                                    update_matrix[row_idx - 1][i] = row[col_idx] if col_idx < len(row) else ''
-                        else:
-                            # Сохраняем оригинальные значения для строк без совпадения
-                            for i, col_idx in enumerate(target_indices):
-                                update_matrix[row_idx - 1][i] = row[col_idx] if col_idx < len(row) else ''
-                    else:
-                        # Для строк без wild данных
-                        for i, col_idx in enumerate(target_indices):
-                            update_matrix[row_idx - 1][i] = row[col_idx] if col_idx < len(row) else ''
-
-                updates.append({
-                    'range': update_range,
-                    'values': update_matrix
-                })
-            else:
-                # Если колонки не подряд, обновляем каждую колонку отдельно
-                for col_idx in target_indices:
-                    header = headers[col_idx]
-                    col_letter = self.get_column_letter(col_idx + 1)
-                    # ПРАВИЛЬНЫЙ формат: "AX2:AX5886"
-                    col_range = f"{col_letter}2:{col_letter}{len(all_data)}"
-
-                    # logger.info(f"Обновляем колонку: {col_range}")
-                    print(f"Обновляем колонку: {col_range}")
-
-                    # Подготавливаем данные для столбца
-                    column_data = []
-                    for row_idx in range(1, len(all_data)):
-                        row = all_data[row_idx]
-                        if len(row) > wild_col_idx:
-                            current_wild = row[wild_col_idx]
-                            if current_wild in data_dict and header in data_dict[current_wild]:
-                                column_data.append([data_dict[current_wild][header]])
-                            else:
-                                column_data.append([row[col_idx] if col_idx < len(row) else ''])
-                        else:
-                            column_data.append([row[col_idx] if col_idx < len(row) else ''])
-
-                    updates.append({
-                        'range': col_range,
-                        'values': column_data
-                    })
-
-            # pprint(updates)
-
-            # Выполняем обновление
-            if updates:
-                for i, update in enumerate(updates):
-                    try:
-                        self.sheet.update(update['range'], update['values'], value_input_option='USER_ENTERED')
-                        # logger.info(f"Успешно обновлен диапазон {update['range']} ({i + 1}/{len(updates)})")
-                        print(f"Успешно обновлен диапазон {update['range']} ({i + 1}/{len(updates)})")
-
-                    except Exception as e:
-                        print(f"Ошибка при обновлении {update['range']}: {e}")
-
-                        # logger.error(f"Ошибка при обновлении {update['range']}: {e}")
-                        # Можно добавить повторные попытки или продолжить
+
+            # Ключи сравниваются в нормализованном виде: "12", 12 и "12.0" - один ключ
+            keyed_data = {normalize_key(key): values for key, values in data_dict.items()}
+            keyed_data.pop(None, None)
+
+            # Читаем только ключевую колонку и целевые колонки
+            key_header = headers[wild_col_idx]
+            read_headers = [key_header] + [headers[col_idx] for col_idx in target_indices]
+            changed_cells = {}
+            rows_read = 0
+            async for start, rows in self.read_columns(read_headers):
+                rows_read += len(rows)
+                # Сравниваем с прочитанными значениями: в запись попадают только измененные ячейки
+                for row_number, row in enumerate(rows, start=start):
+                    wild_data = keyed_data.get(normalize_key(row[0]))
+                    if wild_data is None:
+                        continue
+                    for header, col_idx, current in zip(read_headers[1:], target_indices, row[1:]):
+                        if header not in wild_data:
+                            continue
+                        value = wild_data[header]
+                        if ('' if value is None else str(value)) != current:
+                            changed_cells[(row_number, col_idx + 1)] = value
+
+            current_headers, current_map = await self.get_headers()
+            if [current_map.get(header) for header in read_headers] != [wild_col_idx] + target_indices:
+                # заголовки изменились после выбора колонок - дальнейшая запись была бы неверной
+                raise ValueError("Заголовки листа изменились во время обновления, повторите операцию")
+            if not rows_read:
+                print("Таблица пуста или содержит только заголовки")
+                return
+            if not changed_cells:
+                print("Изменений нет")
+                return
+
+            # Измененные ячейки объединяются в прямоугольные диапазоны и уходят одним batch_update
+            # (несколькими - только если превышены лимиты GS_BATCH_MAX_CELLS / GS_BATCH_MAX_RANGES)
+            updates = coalesce_cells(changed_cells)
+            print(f"Обновляем {len(changed_cells)} ячеек в {len(updates)} диапазонах")
+            for batch in chunk_updates(updates, settings.GS_BATCH_MAX_CELLS, settings.GS_BATCH_MAX_RANGES):
+                await self._batch_update(batch, value_input_option='USER_ENTERED')
+                SHEET_CELLS.labels("write").inc(sum(count_cells(update['values']) for update in batch))
 
         except Exception as e:
             # logger.error(f"Ошибка при вставке данных: {e}")
@@ -273,65 +318,296 @@ class PCGoogleSheet:
             raise
 
 
-    @retry_on_quota_exceeded_async()
     async def update_revenue_rows(self, data_json, table_id="Артикул"):
-        # Получаем текущие данные из таблицы
-        data = self.sheet.get_all_records(expected_headers=[])
-        df = pd.DataFrame(data)
-
-        # Если DataFrame пустой (только заголовки или вообще ничего)
-        if df.empty or table_id not in df.columns:
-            # Таблица пустая, все артикулы будут новыми
-            existing_articles = set()
-        else:
-            # Таблица не пустая, получаем существующие артикулы
-            existing_articles = set(df[table_id].dropna().unique())
-
-        # Преобразуем входные данные
-        json_df = pd.DataFrame.from_dict(data_json, orient='index')
-        json_df = json_df.astype(object).where(pd.notnull(json_df), None)
-
-        # 1. Добавляем новые артикулы, которых нет в таблице
-        new_articles = [art for art in json_df.index if art not in existing_articles]
-
-        if new_articles:
-            # Получаем заголовки
-            if df.empty:
-                # Если таблица полностью пустая, получаем заголовки из листа
-                headers = self.sheet.row_values(1)  # Первая строка с заголовками
-            else:
-                headers = df.columns.tolist()
-
+        """
+        Записывает данные {ключ: {заголовок: значение}} в лист через sync_rows.
+        """
+        columns = [table_id]
+        for values in data_json.values():
+            for column in values:
+                if column not in columns:
+                    columns.append(column)
+
+        async def single_batch():
+            yield [[key] + [values.get(column) for column in columns[1:]] for key, values in data_json.items()]
+
+        return await self.sync_rows(columns, single_batch(), table_id=table_id)
+
+    async def sync_rows(
+            self,
+            columns: List[str],
+            batches: AsyncIterable[List[list]],
+            table_id: str = "Артикул",
+            checkpoint=None,
+    ) -> dict:
+        """
+        Потоковая запись строк в лист.
+
+        Args:
+            columns: заголовки листа, которым соответствуют значения в строках
+            batches: асинхронный поток пачек строк (значения в порядке columns);
+                None в значении означает "не изменять ячейку"
+            table_id: заголовок ключевой колонки, должен входить в columns
+            checkpoint: журнал пачек записи (MemoryCheckpointStore или
+                SheetCheckpointRepository); по умолчанию - общий журнал в памяти процесса
+
+        Из листа постранично читаются только колонки columns, строится индекс
+        ключ -> номера строк по колонке table_id, значения сравниваются с текущими,
+        и записываются только изменившиеся ячейки, объединенные в прямоугольные
+        диапазоны и отправленные пачками batch_update.
+        Новые ключи записываются явными диапазонами в колонки выгрузки, ниже последней
+        непустой строки листа (с учетом остальных колонок).
+        Накопленные изменения отправляются по мере достижения лимита пачки, поэтому
+        память не зависит от объема выгрузки.
+
+        Каждая пачка идемпотентна (запись значений в конкретные диапазоны) и сначала
+        сохраняется в журнал checkpoint, а после отправки отмечается примененной.
+        При ошибке запись продолжается с первой неприменной пачки без повторного
+        чтения листа; пачки, оставшиеся после неудачной синхронизации, дописываются
+        в начале следующей.
+
+        Returns:
+            Счетчики строк: total, inserted (новые), updated (с изменениями), unchanged
+        """
+        key_pos = columns.index(table_id)
+        checkpoint = checkpoint if checkpoint is not None else memory_checkpoints
+        checkpoint_key = (self.spreadsheet, self.sheet_name)
+        # сначала дописываем пачки, оставшиеся от прерванной синхронизации
+        await self._apply_pending(checkpoint, checkpoint_key, resumed=True)
+
+        # Читаем из листа только колонки выгрузки; индекс нормализованный ключ -> номера строк
+        # (с 1, с учетом заголовков), так что "12", 12 и "12.0" считаются одним ключом
+        current_rows = {}
+        row_index = SheetKeyIndex()
+        last_row = 1
+        with track_stage("db_to_sheet", "sheet_fetch"):
+            async for start, rows in self.read_columns(columns):
+                last_row = start + len(rows) - 1
+                for row_number, row in enumerate(rows, start=start):
+                    if row[key_pos] != '':
+                        row_index.add(row[key_pos], row_number)
+                        current_rows[row_number] = row
+        _, header_map = await self.get_headers()
+        col_indices = [header_map.get(column) for column in columns]
+        # колонки листа, в которые пишутся новые строки: только колонки выгрузки
+        row_columns = [col_idx for col_idx in col_indices if col_idx is not None]
+
+        max_cells = settings.GS_BATCH_MAX_CELLS
+        changed_cells = {}
+        new_rows = []
+        next_row = None
+        total_changed = total_new = 0
+        counts = {"total": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+
+        async def flush_new_rows():
+            nonlocal new_rows, next_row, total_new
+            if next_row is None:
+                # last_row учитывает только колонки выгрузки - ниже могут быть данные в других колонках
+                next_row = await self._first_free_row(last_row)
+            total_new += len(new_rows)
+            next_row = await self._plan_rows(checkpoint, checkpoint_key, new_rows, next_row, row_columns) + 1
             new_rows = []
 
-            for article in new_articles:
-                new_row = {col: "" for col in headers}  # Пустая строка
-                new_row[table_id] = article  # Устанавливаем артикул
+        async for batch in batches:
+            for values in batch:
+                key = values[key_pos]
+                if normalize_key(key) is None:
+                    continue
+                counts["total"] += 1
+                row_numbers = row_index.get(key)
+
+                # 1. Новые ключи, которых нет в таблице
+                if row_numbers is None:
+                    new_rows.append([
+                        '' if value is None else value
+                        for col_idx, value in zip(col_indices, values) if col_idx is not None
+                    ])
+                    counts["inserted"] += 1
+                    # повтор ключа в потоке не должен добавлять строку второй раз
+                    row_index.reserve(key)
+                    continue
+
+                # 2. Существующие строки - только изменившиеся ячейки
+                cells_before = len(changed_cells)
+                for row_number in row_numbers:
+                    current_row = current_rows[row_number]
+                    for col_idx, value, current in zip(col_indices, values, current_row):
+                        if col_idx is None or value is None:
+                            continue
+                        if str(value) != current:
+                            changed_cells[(row_number, col_idx + 1)] = value
+                if len(changed_cells) > cells_before:
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+
+            if len(changed_cells) >= max_cells:
+                total_changed += len(changed_cells)
+                await self._plan_cells(checkpoint, checkpoint_key, changed_cells)
+                await self._apply_pending(checkpoint, checkpoint_key)
+                changed_cells = {}
+            if len(new_rows) * max(len(row_columns), 1) >= max_cells:
+                await flush_new_rows()
+                await self._apply_pending(checkpoint, checkpoint_key)
+
+        if new_rows:
+            # Вставляем новые строки
+            await flush_new_rows()
+        total_changed += len(changed_cells)
+        await self._plan_cells(checkpoint, checkpoint_key, changed_cells)
+        await self._apply_pending(checkpoint, checkpoint_key)
+        await checkpoint.clear(checkpoint_key)
+        print(f"Новых строк: {total_new}, измененных ячеек: {total_changed}")
+        return counts
+
+    async def _plan_cells(self, checkpoint, checkpoint_key, changed_cells: dict) -> None:
+        """Добавляет в журнал пачки batch_update с измененными ячейками, объединенными в диапазоны."""
+        updates = coalesce_cells(changed_cells)
+        for batch in chunk_updates(updates, settings.GS_BATCH_MAX_CELLS, settings.GS_BATCH_MAX_RANGES):
+            await checkpoint.add(checkpoint_key, {"updates": batch})
+
+    async def _first_free_row(self, last_row: int) -> int:
+        """Первая строка после last_row, ниже которой лист пуст по всей ширине."""
+        first_free = last_row + 1
+        while True:
+            row_count = self.sheet.row_count
+            # API отбрасывает пустые строки в конце диапазона
+            taken = len(await self._read_rows(first_free, row_count))
+            first_free += taken
+            if not taken or first_free <= row_count:
+                return first_free
+            # занятые строки доходят до конца сетки - ее размер в кэше мог устареть
+            await self._refresh_sheet()
+            if self.sheet.row_count == row_count:
+                return first_free
+
+    async def _plan_rows(self, checkpoint, checkpoint_key, rows: list, first_row: int, columns: List[int]) -> int:
+        """
+        Добавляет в журнал запись новых строк с first_row (вместо неидемпотентного
+        append_rows). Значения rows - в порядке columns (индексы колонок листа с нуля),
+        пишутся только эти колонки. Возвращает номер последней строки.
+        """
+        if not rows or not columns:
+            return first_row - 1
+        rows_per_batch = max(1, settings.GS_BATCH_MAX_CELLS // len(columns))
+        for offset in range(0, len(rows), rows_per_batch):
+            await checkpoint.add(checkpoint_key, {
+                "new_rows": True,
+                "first_row": first_row + offset,
+                "columns": columns,
+                "rows": rows[offset:offset + rows_per_batch],
+            })
+        return first_row + len(rows) - 1
 
-                # Заполняем доступные данные из json_df
-                for col in json_df.columns:
-                    if col in headers:
-                        new_row[col] = json_df.at[article, col]
+    @staticmethod
+    def _row_updates(payload: dict) -> List[dict]:
+        """Диапазоны batch_update для пачки новых строк: по отрезку подряд идущих колонок."""
+        first_row, rows, columns = payload["first_row"], payload["rows"], payload["columns"]
+        last_row = first_row + len(rows) - 1
+        position = {col_idx: i for i, col_idx in enumerate(columns)}
+        return [
+            {
+                "range": a1_range(first_row, first + 1, last_row, last + 1),
+                "values": [[row[position[col_idx]] for col_idx in range(first, last + 1)] for row in rows],
+            }
+            for first, last in _column_runs(columns)
+        ]
+
+    async def _apply_pending(self, checkpoint, checkpoint_key, resumed: bool = False) -> None:
+        """
+        Отправляет неприменные пачки журнала по порядку, отмечая каждую примененной.
 
-                new_rows.append([new_row.get(col, "") for col in headers])
+        Если ограничитель запросов исчерпал повторы при временной ошибке, запись
+        возобновляется с той же пачки до settings.GS_WRITE_RESUME_ATTEMPTS раз;
+        уже примененные пачки повторно не отправляются.
 
-            # Вставляем новые строки
-            self.sheet.append_rows(new_rows)
-
-        # 2. Обновляем существующие данные (только если таблица не пустая)
-        if not df.empty and table_id in df.columns:
-            updates = []
-            headers = df.columns.tolist()
-
-            for index, row in json_df.iterrows():
-                matching_rows = df[df[table_id] == index].index
-                for idx in matching_rows:
-                    row_number = idx + 2
-                    for column in row.index:
-                        if column in headers:
-                            column_index = headers.index(column) + 1
-                            column_letter = column_index_to_letter(column_index)
-                            updates.append({'range': f'{column_letter}{row_number}', 'values': [[row[column]]]})
-
-            if updates:
-                self.sheet.batch_update(updates)
\ No newline at end of file
+        resumed - пачки остались от прерванной синхронизации: новые строки из них
+        пишутся, только если целевые строки листа все еще пусты (или уже записаны).
+        """
+        attempt = 0
+        while True:
+            try:
+                for batch_no, payload in await checkpoint.pending(checkpoint_key):
+                    if resumed and payload.get("new_rows") and not await self._rows_free(payload):
+                        print(f"Пачка {batch_no} пропущена: строки для новых записей уже заняты")
+                    else:
+                        await self._apply_batch(payload)
+                    await checkpoint.mark_applied(checkpoint_key, batch_no)
+                return
+            except Exception as e:
+                if resumed and not is_retryable(e):
+                    # оставшиеся пачки API не принимает - отбрасываем их, нужные
+                    # изменения заново вычислит сравнение с листом в этой синхронизации
+                    print(f"Пачки прерванной синхронизации отброшены: {e}")
+                    for batch_no, _ in await checkpoint.pending(checkpoint_key):
+                        await checkpoint.mark_applied(checkpoint_key, batch_no)
+                    await checkpoint.clear(checkpoint_key)
+                    return
+                if not is_retryable(e) or attempt >= settings.GS_WRITE_RESUME_ATTEMPTS:
+                    raise
+                delay = self.limiter.backoff(self.limiter.max_retries)
+                attempt += 1
+                print(f"Запись прервана: {e} | продолжение с неприменной пачки через {delay:.1f} сек "
+                      f"(попытка {attempt}/{settings.GS_WRITE_RESUME_ATTEMPTS})")
+                await asyncio.sleep(delay)
+
+    async def _write_updates(self, updates: List[dict], min_rows: Optional[int] = None) -> None:
+        if min_rows and self.sheet.row_count < min_rows:
+            # новые строки пишутся за пределы сетки листа - сначала расширяем ее
+            await self._write(self.sheet.add_rows, min_rows - self.sheet.row_count)
+        with track_stage("db_to_sheet", "batch_update"):
+            await self._batch_update(updates)
+
+    async def _read_rows(self, first_row: int, last_row: int) -> list:
+        """Строки листа целиком; строки за пределами сетки листа считаются пустыми."""
+        try:
+            return await self._read_grid_rows(first_row, last_row)
+        except Exception as e:
+            if not is_grid_limit_error(e):
+                raise
+            # сетку листа уменьшили после кэширования дескриптора
+            await self._refresh_sheet()
+            return await self._read_grid_rows(first_row, last_row)
+
+    async def _read_grid_rows(self, first_row: int, last_row: int) -> list:
+        last_row = min(last_row, self.sheet.row_count)
+        if first_row > last_row:
+            return []
+        values = await self._read(self.sheet.batch_get, [f"{first_row}:{last_row}"])
+        return values[0] if values else []
+
+    async def _rows_free(self, payload: dict) -> bool:
+        """
+        Строки пачки новых строк свободны: в колонках вне выгрузки пусто, а в колонках
+        выгрузки пусто или уже записаны значения пачки (повтор после сбоя).
+        """
+        first_row, rows, columns = payload["first_row"], payload["rows"], payload["columns"]
+        current = await self._read_rows(first_row, first_row + len(rows) - 1)
+        position = {col_idx: i for i, col_idx in enumerate(columns)}
+        for row, expected in zip(current, rows):
+            for col_idx, value in enumerate(row):
+                if value == '':
+                    continue
+                i = position.get(col_idx)
+                if i is None or value != str(expected[i]):
+                    return False
+        return True
+
+    async def _apply_batch(self, payload: dict) -> None:
+        if payload.get("new_rows"):
+            updates = self._row_updates(payload)
+            min_rows = payload["first_row"] + len(payload["rows"]) - 1
+        else:
+            updates, min_rows = payload["updates"], None
+        try:
+            await self._write_updates(updates, min_rows)
+        except Exception as e:
+            if not is_grid_limit_error(e):
+                raise
+            # сетку листа уменьшили после кэширования дескриптора - обновляем его и повторяем;
+            # updates не изменены неудачной попыткой (_batch_update отправляет копии)
+            await self._refresh_sheet()
+            await self._write_updates(updates, min_rows)
+        if payload.get("new_rows"):
+            SHEET_ROWS.labels("write").inc(len(payload["rows"]))
+        SHEET_CELLS.labels("write").inc(sum(count_cells(update["values"]) for update in updates))
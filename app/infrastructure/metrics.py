@@ -0,0 +1,54 @@
+import time
+from contextlib import contextmanager
+
+from asyncpg import Pool
+from prometheus_client import Counter, Gauge, Histogram
+
+# Длительность этапов синхронизации: pipeline - направление, stage - этап
+STAGE_SECONDS = Histogram(
+    "apk_sync_stage_seconds",
+    "Длительность этапа синхронизации",
+    ["pipeline", "stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+SHEET_ROWS = Counter("apk_sheet_rows_total", "Строк прочитано/записано в Google Sheets", ["operation"])
+SHEET_CELLS = Counter("apk_sheet_cells_total", "Ячеек прочитано/записано в Google Sheets", ["operation"])
+DB_ROWS = Counter("apk_db_rows_total", "Строк прочитано/записано в БД", ["operation"])
+SHEETS_API_CALLS = Counter("apk_sheets_api_calls_total", "Вызовов Google Sheets API", ["kind", "method"])
+SHEETS_API_RETRIES = Counter("apk_sheets_api_retries_total", "Повторов вызовов Google Sheets API", ["kind", "method"])
+SHEETS_API_ERRORS = Counter("apk_sheets_api_errors_total", "Неудачных вызовов Google Sheets API", ["kind", "method"])
+
+DB_POOL_SIZE = Gauge("apk_db_pool_size", "Открытых соединений в пуле asyncpg")
+DB_POOL_IDLE = Gauge("apk_db_pool_idle", "Свободных соединений в пуле asyncpg")
+DB_POOL_IN_USE = Gauge("apk_db_pool_in_use", "Занятых соединений в пуле asyncpg")
+DB_POOL_MAX = Gauge("apk_db_pool_max_size", "Максимальный размер пула asyncpg")
+DB_POOL_WAITING = Gauge("apk_db_pool_waiting", "Запросов, ожидающих свободное соединение пула")
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "apk_db_pool_acquire_seconds",
+    "Ожидание свободного соединения пула asyncpg",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+
+@contextmanager
+def track_stage(pipeline: str, stage: str):
+    """Замеряет длительность блока как этап pipeline."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(pipeline, stage).observe(time.perf_counter() - started)
+
+
+def count_cells(rows) -> int:
+    return sum(len(row) for row in rows)
+
+
+def observe_pool(pool: Pool) -> None:
+    """Обновляет метрики пула соединений перед отдачей /metrics."""
+    size = pool.get_size()
+    idle = pool.get_idle_size()
+    DB_POOL_SIZE.set(size)
+    DB_POOL_IDLE.set(idle)
+    DB_POOL_IN_USE.set(size - idle)
+    DB_POOL_MAX.set(pool.get_max_size())
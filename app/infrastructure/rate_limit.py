@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+import gspread
+import requests
+
+from app.infrastructure.executor import run_blocking
+from app.infrastructure.metrics import SHEETS_API_CALLS, SHEETS_API_ERRORS, SHEETS_API_RETRIES
+from config import settings
+
+# Коды ответов Google API, при которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate_per_minute токенов в минуту, не больше capacity разом."""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.waiting = 0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        self.waiting += 1
+        try:
+            # очередь через lock сохраняет порядок и не дает ожидающим обгонять друг друга
+            async with self._lock:
+                self._refill()
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def state(self) -> dict:
+        self._refill()
+        return {
+            "rate_per_minute": self.rate * 60,
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 3),
+            "waiting": self.waiting,
+        }
+
+
+def is_retryable(error: Exception) -> bool:
+    """Временная ошибка (квота, 5xx, сеть) - повторяем; остальные (400, 403, 404...) - фатальные."""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code in RETRYABLE_STATUS_CODES or error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def is_grid_limit_error(error: Exception) -> bool:
+    """Диапазон за пределами сетки листа - обычно сетку уменьшили, а размер листа в кэше устарел."""
+    return isinstance(error, gspread.exceptions.APIError) and "exceeds grid limits" in str(error)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах, если сервер его прислал."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class SheetsRateLimiter:
+    """
+    Общий для процесса ограничитель запросов к Google Sheets.
+
+    Чтение и запись идут через отдельные token bucket по квотам API. При временной
+    ошибке запрос повторяется с экспоненциальной задержкой и jitter (или по Retry-After),
+    а после ответа 429 все запросы процесса приостанавливаются до конца задержки,
+    чтобы параллельные синхронизации не добивали квоту одновременно.
+    """
+
+    def __init__(
+            self,
+            read_per_minute: float,
+            write_per_minute: float,
+            burst: float,
+            max_retries: int,
+            backoff_base: float,
+            backoff_max: float,
+    ):
+        self.buckets = {
+            "read": TokenBucket(read_per_minute, burst),
+            "write": TokenBucket(write_per_minute, burst),
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._blocked_until = 0.0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с jitter для попытки attempt (с нуля)."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def call(self, kind: str, func, *args, **kwargs):
+        """Выполняет блокирующий вызов gspread с учетом квоты kind ('read' или 'write')."""
+        bucket = self.buckets[kind]
+        method = getattr(func, "__name__", "unknown")
+        attempt = 0
+        while True:
+            pause = self._blocked_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await bucket.acquire()
+            self.calls += 1
+            SHEETS_API_CALLS.labels(kind, method).inc()
+            try:
+                return await run_blocking(func, *args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    SHEETS_API_ERRORS.labels(kind, method).inc()
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = self.backoff(attempt)
+                if isinstance(e, gspread.exceptions.APIError) and e.code == 429:
+                    self.throttled += 1
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                self.retries += 1
+                SHEETS_API_RETRIES.labels(kind, method).inc()
+                attempt += 1
+                print(f"Error: {e} | попытка {attempt}/{self.max_retries}, повтор через {delay:.1f} сек")
+                await asyncio.sleep(delay)
+
+    def state(self) -> dict:
+        return {
+            "read": self.buckets["read"].state(),
+            "write": self.buckets["write"].state(),
+            "blocked_for": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "throttled": self.throttled,
+        }
+
+
+sheets_limiter = SheetsRateLimiter(
+    read_per_minute=settings.GS_READ_REQUESTS_PER_MINUTE,
+    write_per_minute=settings.GS_WRITE_REQUESTS_PER_MINUTE,
+    burst=settings.GS_RATE_BURST,
+    max_retries=settings.GS_MAX_RETRIES,
+    backoff_base=settings.GS_BACKOFF_BASE,
+    backoff_max=settings.GS_BACKOFF_MAX,
+)
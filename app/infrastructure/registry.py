@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import gspread
+from gspread import Client, service_account
+
+from app.infrastructure.emulator import get_emulator
+from app.infrastructure.executor import run_blocking
+from app.infrastructure.rate_limit import SheetsRateLimiter, sheets_limiter
+from config import settings
+
+SheetKey = Tuple[str, str, str]
+
+
+class TTLCache:
+    """Простой LRU-кэш с ограничением по времени жизни записей."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SheetRegistry:
+    """
+    Общий для процесса реестр клиентов Google, открытых таблиц/листов и карт заголовков.
+
+    Ключ листа - (creds_json, spreadsheet, sheet). Таблица после первого открытия
+    по названию запоминается по spreadsheet.id и в дальнейшем открывается через
+    open_by_key, без поиска по Drive.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 3600, limiter: SheetsRateLimiter = sheets_limiter):
+        self.limiter = limiter
+        self.clients = TTLCache(maxsize, ttl)
+        self.spreadsheet_ids = TTLCache(maxsize, ttl)
+        self.spreadsheets = TTLCache(maxsize, ttl)
+        self.worksheets = TTLCache(maxsize, ttl)
+        self.headers = TTLCache(maxsize, ttl)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+    def _lock(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def get_client(self, creds_json: str) -> Client:
+        """Возвращает авторизованный клиент, читая файл ключей только один раз."""
+        client = self.clients.get(creds_json)
+        if client is not None:
+            return client
+        async with self._lock(("client", creds_json)):
+            client = self.clients.get(creds_json)
+            if client is None:
+                if settings.GS_BACKEND == "emulator":
+                    client = get_emulator().client()
+                else:
+                    client = await run_blocking(service_account, filename=creds_json)
+                self.clients.set(creds_json, client)
+        return client
+
+    async def get_spreadsheet(self, creds_json: str, spreadsheet: str) -> gspread.Spreadsheet:
+        key = (creds_json, spreadsheet)
+        handle = self.spreadsheets.get(key)
+        if handle is not None:
+            return handle
+        async with self._lock(("spreadsheet",) + key):
+            handle = self.spreadsheets.get(key)
+            if handle is None:
+                client = await self.get_client(creds_json)
+                spreadsheet_id = self.spreadsheet_ids.get(key)
+                if spreadsheet_id is not None:
+                    handle = await self.limiter.call("read", client.open_by_key, spreadsheet_id)
+                else:
+                    handle = await self.limiter.call("read", client.open, spreadsheet)
+                    self.spreadsheet_ids.set(key, handle.id)
+                self.spreadsheets.set(key, handle)
+        return handle
+
+    async def get_worksheet(self, creds_json: str, spreadsheet: str, sheet: str) -> gspread.Worksheet:
+        key = (creds_json, spreadsheet, sheet)
+        handle = self.worksheets.get(key)
+        if handle is not None:
+            return handle
+        async with self._lock(("worksheet",) + key):
+            handle = self.worksheets.get(key)
+            if handle is None:
+                spreadsheet_handle = await self.get_spreadsheet(creds_json, spreadsheet)
+                handle = await self.limiter.call("read", spreadsheet_handle.worksheet, sheet)
+                self.worksheets.set(key, handle)
+        return handle
+
+    async def refresh_worksheet(self, creds_json: str, spreadsheet: str, sheet: str) -> gspread.Worksheet:
+        """Перечитывает свойства листа (размер сетки) и заменяет дескриптор в кэше."""
+        key = (creds_json, spreadsheet, sheet)
+        async with self._lock(("worksheet",) + key):
+            spreadsheet_handle = await self.get_spreadsheet(creds_json, spreadsheet)
+            handle = await self.limiter.call("read", spreadsheet_handle.worksheet, sheet)
+            self.worksheets.set(key, handle)
+        return handle
+
+    async def get_headers(self, key: SheetKey, worksheet: gspread.Worksheet) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Возвращает строку заголовков листа и карту заголовок -> индекс колонки (с нуля).
+        """
+        cached = self.headers.get(key)
+        if cached is not None:
+            return cached
+        async with self._lock(("headers",) + key):
+            cached = self.headers.get(key)
+            if cached is None:
+                headers = await self.limiter.call("read", worksheet.row_values, 1)
+                cached = self.set_headers(key, headers)
+        return cached
+
+    def set_headers(self, key: SheetKey, headers: List[str]) -> Tuple[List[str], Dict[str, int]]:
+        """Запоминает заголовки, уже полученные другим запросом (например, get_all_values)."""
+        header_map = {}
+        for idx, header in enumerate(headers):
+            # при дублирующихся заголовках оставляем первый, как headers.index()
+            header_map.setdefault(header, idx)
+        cached = (list(headers), header_map)
+        self.headers.set(key, cached)
+        return cached
+
+    def invalidate_headers(self, key: SheetKey) -> None:
+        self.headers.pop(key)
+
+    def invalidate(self, creds_json: str, spreadsheet: Optional[str] = None, sheet: Optional[str] = None) -> None:
+        """
+        Явная инвалидация записей реестра.
+
+        Без spreadsheet сбрасывается все, что связано с файлом ключей (включая клиента),
+        без sheet - таблица и все ее листы, иначе - только один лист.
+        """
+        for cache in (self.worksheets, self.headers):
+            for key in cache.keys():
+                if key[0] != creds_json:
+                    continue
+                if spreadsheet is not None and key[1] != spreadsheet:
+                    continue
+                if sheet is not None and key[2] != sheet:
+                    continue
+                cache.pop(key)
+        if sheet is not None:
+            return
+        for cache in (self.spreadsheets, self.spreadsheet_ids):
+            for key in cache.keys():
+                if key[0] == creds_json and (spreadsheet is None or key[1] == spreadsheet):
+                    cache.pop(key)
+        if spreadsheet is None:
+            self.clients.pop(creds_json)
+
+    def clear(self) -> None:
+        for cache in (self.clients, self.spreadsheet_ids, self.spreadsheets, self.worksheets, self.headers):
+            cache.clear()
+
+
+sheet_registry = SheetRegistry(maxsize=settings.GS_CACHE_MAXSIZE, ttl=settings.GS_CACHE_TTL)
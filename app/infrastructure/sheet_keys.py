@@ -0,0 +1,68 @@
+import math
+import re
+from typing import Any, Dict, Hashable, List, Optional
+
+# Целое число, в том числе как его показывает лист: "12.0", "1 234"
+_INTEGER = re.compile(r"[+-]?(?:0|[1-9]\d*)(?:\.0+)?")
+# Пробелы-разделители разрядов (обычный, неразрывный, узкий неразрывный)
+_DIGIT_SEPARATORS = str.maketrans("", "", " \u00a0\u202f")
+
+
+def normalize_key(value: Any) -> Optional[Hashable]:
+    """
+    Приводит значение ключевой колонки к сравнимому виду.
+
+    Числовые ключи ("12", 12, "12.0", " 12 ", 12.0) -> int 12, остальные -> строка
+    без крайних пробелов. Строки с ведущими нулями ("007") остаются строками.
+    Пустое значение -> None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        return int(value) if value.is_integer() else str(value)
+    text = str(value).strip()
+    if not text:
+        return None
+    compact = text.translate(_DIGIT_SEPARATORS)
+    if _INTEGER.fullmatch(compact):
+        return int(compact.partition(".")[0])
+    return text
+
+
+class SheetKeyIndex:
+    """
+    Индекс нормализованный ключ -> номера строк листа (с 1).
+
+    Общий для путей обновления и добавления строк: новый ключ резервируется
+    в индексе, поэтому повтор ключа в потоке не добавит строку второй раз.
+    """
+
+    def __init__(self):
+        self._rows: Dict[Hashable, List[int]] = {}
+
+    def add(self, value: Any, row_number: int) -> None:
+        key = normalize_key(value)
+        if key is not None:
+            self._rows.setdefault(key, []).append(row_number)
+
+    def get(self, value: Any) -> Optional[List[int]]:
+        key = normalize_key(value)
+        return None if key is None else self._rows.get(key)
+
+    def reserve(self, value: Any) -> None:
+        """Отмечает ключ как уже добавляемый в лист."""
+        key = normalize_key(value)
+        if key is not None:
+            self._rows.setdefault(key, [])
+
+    def __contains__(self, value: Any) -> bool:
+        return self.get(value) is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,126 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+Cell = Tuple[int, int]
+
+
+def column_letter(col_idx: int) -> str:
+    """Конвертирует номер колонки (с 1) в букву (A, B, ..., AA, ...)"""
+    result = ""
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        result = chr(65 + remainder) + result
+    return result
+
+
+def a1_range(start_row: int, start_col: int, end_row: int, end_col: int) -> str:
+    """Диапазон в нотации A1, номера строк и колонок с 1"""
+    start = f"{column_letter(start_col)}{start_row}"
+    if start_row == end_row and start_col == end_col:
+        return start
+    return f"{start}:{column_letter(end_col)}{end_row}"
+
+
+def coalesce_cells(cells: Dict[Cell, Any]) -> List[Dict[str, Any]]:
+    """
+    Объединяет измененные ячейки в минимальное число прямоугольных диапазонов.
+
+    Args:
+        cells: {(номер строки, номер колонки): значение}, нумерация с 1
+
+    Returns:
+        Список {'range': 'B2:D5', 'values': [[...], ...]} для batch_update.
+        В диапазоны попадают только переданные ячейки.
+    """
+    by_row: Dict[int, List[int]] = {}
+    for row, col in cells:
+        by_row.setdefault(row, []).append(col)
+
+    rectangles = []
+    # открытые прямоугольники по горизонтальному отрезку (первая колонка, последняя колонка)
+    open_rects: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+    for row in sorted(by_row):
+        cols = sorted(by_row[row])
+        runs = []
+        start = prev = cols[0]
+        for col in cols[1:]:
+            if col != prev + 1:
+                runs.append((start, prev))
+                start = col
+            prev = col
+        runs.append((start, prev))
+
+        still_open = {}
+        for run in runs:
+            values = [cells[(row, col)] for col in range(run[0], run[1] + 1)]
+            rect = open_rects.pop(run, None)
+            if rect is not None and rect["end_row"] == row - 1:
+                rect["end_row"] = row
+                rect["values"].append(values)
+            else:
+                if rect is not None:
+                    rectangles.append(rect)
+                rect = {"start_row": row, "end_row": row, "run": run, "values": [values]}
+            still_open[run] = rect
+        # отрезки, не продолжившиеся в этой строке, закрываются
+        rectangles.extend(open_rects.values())
+        open_rects = still_open
+
+    rectangles.extend(open_rects.values())
+    rectangles.sort(key=lambda r: (r["start_row"], r["run"][0]))
+    return [
+        {
+            "range": a1_range(r["start_row"], r["run"][0], r["end_row"], r["run"][1]),
+            "values": r["values"],
+        }
+        for r in rectangles
+    ]
+
+
+def chunk_updates(
+        updates: Iterable[Dict[str, Any]],
+        max_cells: int,
+        max_ranges: int,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Делит диапазоны на пачки для batch_update с ограничением по числу ячеек и диапазонов.
+
+    Диапазон крупнее max_cells режется по строкам.
+    """
+    batch: List[Dict[str, Any]] = []
+    batch_cells = 0
+    for update in updates:
+        for part in _split_update(update, max_cells):
+            size = sum(len(row) for row in part["values"])
+            if batch and (batch_cells + size > max_cells or len(batch) >= max_ranges):
+                yield batch
+                batch, batch_cells = [], 0
+            batch.append(part)
+            batch_cells += size
+    if batch:
+        yield batch
+
+
+def _split_update(update: Dict[str, Any], max_cells: int) -> Iterator[Dict[str, Any]]:
+    values = update["values"]
+    width = max((len(row) for row in values), default=1) or 1
+    rows_per_part = max(1, max_cells // width)
+    if len(values) <= rows_per_part:
+        yield update
+        return
+
+    start, _, end = update["range"].partition(":")
+    start_col, start_row = _split_a1(start)
+    end_col, _ = _split_a1(end or start)
+    for offset in range(0, len(values), rows_per_part):
+        part = values[offset:offset + rows_per_part]
+        first_row = start_row + offset
+        yield {
+            "range": f"{start_col}{first_row}:{end_col}{first_row + len(part) - 1}",
+            "values": part,
+        }
+
+
+def _split_a1(cell: str) -> Tuple[str, int]:
+    letters = cell.rstrip("0123456789")
+    return letters, int(cell[len(letters):])
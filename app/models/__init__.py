@@ -1,6 +1,15 @@
-from .googlesheet import GoogleSheetParams, CounterpartyModel
+from .googlesheet import GoogleSheetParams, CounterpartyModel, SyncReport
+from .export import ExportFormat
+from .jobs import SyncDirection, JobState, SyncJobStatus, SyncBatchRequest, SyncBatchStatus
 
 __all__ = [
     'GoogleSheetParams',
-    'CounterpartyModel'
+    'CounterpartyModel',
+    'SyncReport',
+    'SyncDirection',
+    'JobState',
+    'SyncJobStatus',
+    'SyncBatchRequest',
+    'SyncBatchStatus',
+    'ExportFormat'
 ]
\ No newline at end of file
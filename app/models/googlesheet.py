@@ -1,19 +1,31 @@
-import pandas as pd
+import hashlib
+import itertools
+import math
+from functools import cached_property
+
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
-from datetime import date
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+from datetime import date, datetime
 
 
 class GoogleSheetParams(BaseModel):
     sheet: str
     spreadsheet: str
     table_id_header: str
+    # Выгрузка БД -> лист: True - выгрузить все строки, а не только измененные с прошлой выгрузки
+    full_refresh: bool = False
+
+
+class SyncReport(BaseModel):
+    """Результат синхронизации лист -> БД"""
+    total: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
 
 
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, ConfigDict, TypeAdapter, ValidationError
 from typing import Optional, ClassVar
-from datetime import date
-import pandas as pd
 
 
 class CounterpartyModel(BaseModel):
@@ -69,6 +81,15 @@ class CounterpartyModel(BaseModel):
     check_1: Optional[str] = Field(None, alias="Проверка")
     check_2: Optional[str] = Field(None, alias="Проверка №2")
 
+    # Поля, которые хранятся в test.test_table (в порядке колонок) и входят в отпечаток строки
+    DB_FIELDS: ClassVar[tuple] = (
+        "id", "opf", "name", "supplier_category", "country", "inn", "tax_system",
+        "reliability_level", "edo_operator", "contact_info", "responsible_person",
+        "comment", "statutory_documents_link", "ka_guarantee_letter",
+        "reliability_update_date", "card_details", "record_sheet_passport",
+        "oi_guarantee_letter",
+    )
+
     # Конфигурация Pydantic V2
     model_config = ConfigDict(
         populate_by_name=True,  # замена allow_population_by_field_name
@@ -81,10 +102,10 @@ class CounterpartyModel(BaseModel):
         """Преобразует строку в дату (работает до валидации)"""
         if v is None or v == '':
             return None
-        try:
-            return pd.to_datetime(v, errors='coerce', dayfirst=True).date()
-        except:
-            return None
+        if isinstance(v, date):
+            # уже разобрано при пакетной нормализации колонки
+            return v
+        return parse_sheet_date(str(v).strip())
 
     @field_validator('id', mode='before')
     @classmethod
@@ -102,76 +123,194 @@ class CounterpartyModel(BaseModel):
         except (ValueError, TypeError):
             return None
 
+    def db_values(self) -> tuple:
+        """Значения полей DB_FIELDS в порядке колонок таблицы."""
+        return tuple(getattr(self, field) for field in self.DB_FIELDS)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Хэш содержимого строки по колонкам БД - для поиска изменившихся строк."""
+        payload = "\x1f".join(
+            "" if value is None else value.isoformat() if isinstance(value, date) else str(value)
+            for value in self.db_values()
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def precompute_fingerprint(self) -> str:
+        """Вычисляет fingerprint заранее: значение кэшируется в модели и передается вместе с ней."""
+        return self.fingerprint
+
+
+_counterparty_list_adapter = TypeAdapter(List[CounterpartyModel])
+
+# Поле модели -> заголовок листа
+SHEET_FIELD_MAPPING = {name: field.alias for name, field in CounterpartyModel.model_fields.items()}
+# Заголовки листа, которые маппятся на поля модели
+SHEET_HEADERS = set(SHEET_FIELD_MAPPING.values())
+ID_HEADER = '№'
+DATE_HEADERS = ['Дата обновления информации по благонадежности']
+
 
-def dataframe_to_models(df: pd.DataFrame) -> List[CounterpartyModel]:
+# Форматы дат в листе: основной дд.мм.гггг, затем ISO и прочие встречающиеся варианты
+SHEET_DATE_FORMATS = (
+    '%d.%m.%Y', '%Y-%m-%d', '%d.%m.%y', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y',
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+)
+
+
+def parse_sheet_date(value: Optional[str], memo: Optional[Dict[str, Optional[date]]] = None) -> Optional[date]:
     """
-    Преобразует DataFrame в список Pydantic моделей с обработкой ошибок типов.
+    Разбирает дату из ячейки листа (день идет первым), нераспознанное -> None.
+    memo - кэш уже разобранных значений: в колонке дат много повторов.
+    """
+    if not value:
+        return None
+    if memo is not None and value in memo:
+        return memo[value]
+    parsed = None
+    for fmt in SHEET_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt).date()
+            break
+        except ValueError:
+            continue
+    if memo is not None:
+        memo[value] = parsed
+    return parsed
+
+
+def coerce_id(value: Any) -> Optional[int]:
+    """ID в любом числовом формате ('12', ' 12 ', '12.0', 12.0) -> int, остальное -> None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if math.isfinite(value) and value.is_integer() else None
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return int(number) if math.isfinite(number) and number.is_integer() else None
+
+
+def validate_rows(
+        columns: List[str],
+        rows: Iterable[List[Any]],
+        row_numbers: Optional[Iterable[int]] = None,
+) -> Tuple[List[CounterpartyModel], List[int], List[Tuple[int, str]]]:
+    """
+    Проверяет строки листа (list[list[str]], как их отдает gspread) без вывода в лог.
+
+    Колонки сопоставляются с полями модели по заголовкам, пустые значения
+    становятся None, ID приводится к int, даты разбираются с кэшем повторов.
+    Валидация - одним вызовом TypeAdapter для всего списка.
 
     Args:
-        df: DataFrame с данными из Google Sheets
+        columns: заголовки колонок, в порядке значений в строках
+        rows: строки значений
+        row_numbers: номера строк в листе (по умолчанию - подряд со второй)
 
     Returns:
-        Список моделей CounterpartyModel
+        (модели, номера строк без ID, ошибки [(номер строки, текст ошибки)])
     """
-    models = []
+    # Берем только колонки, которые маппятся на модель (при повторе заголовка - первую)
+    positions = {}
+    for idx, header in enumerate(columns):
+        if header in SHEET_HEADERS:
+            positions.setdefault(header, idx)
+    id_position = positions.pop(ID_HEADER, None)
+    date_positions = {header: positions.pop(header) for header in DATE_HEADERS if header in positions}
+    positions = list(positions.items())
+    date_positions = list(date_positions.items())
+    if row_numbers is None:
+        row_numbers = itertools.count(2)
 
-    # Сначала предобработаем DataFrame
-    df_clean = df.copy()
+    date_memo: Dict[str, Optional[date]] = {}
+    records = []
+    kept_rows = []
+    skipped = []
+    for row_number, row in zip(row_numbers, rows):
+        width = len(row)
+        model_id = coerce_id(row[id_position]) if id_position is not None and id_position < width else None
+        # Пропускаем строки без ID (они не имеют смысла)
+        if model_id is None:
+            skipped.append(row_number)
+            continue
+        record = {ID_HEADER: model_id}
+        for header, idx in positions:
+            value = row[idx] if idx < width else None
+            if isinstance(value, str):
+                value = value.strip()
+            record[header] = None if value == '' else value
+        for header, idx in date_positions:
+            value = row[idx] if idx < width else None
+            if isinstance(value, str):
+                record[header] = parse_sheet_date(value.strip(), date_memo)
+            else:
+                record[header] = value if value != '' else None
+        records.append(record)
+        kept_rows.append(row_number)
+    row_numbers = kept_rows
 
-    # Заменяем пустые строки и NaN на None
-    df_clean = df_clean.replace(['', ' ', '  ', pd.NA, pd.NaT], None)
+    # Валидация пачкой; строки с ошибками отбрасываем и валидируем остаток заново
+    errors = []
+    while True:
+        try:
+            models = _counterparty_list_adapter.validate_python(records)
+            break
+        except ValidationError as e:
+            bad_positions = set()
+            for error in e.errors():
+                position = error['loc'][0]
+                bad_positions.add(position)
+                errors.append((row_numbers[position], f"{error['loc'][1:]} {error['msg']}"))
+            records = [r for i, r in enumerate(records) if i not in bad_positions]
+            row_numbers = [n for i, n in enumerate(row_numbers) if i not in bad_positions]
+    errors.sort(key=lambda item: item[0])
+    return models, skipped, errors
 
-    # Обрабатываем колонку с ID - преобразуем float в int
-    if '№' in df_clean.columns:
-        df_clean['№'] = df_clean['№'].apply(
-            lambda x: int(x) if pd.notnull(x) and str(x).strip() != '' else None
-        )
 
-    # Обрабатываем числовые поля
-    numeric_fields = ['№']  # добавь другие числовые поля если есть
+def validate_shard(
+        columns: List[str],
+        rows: List[List[Any]],
+        row_numbers: List[int],
+) -> Tuple[List[CounterpartyModel], List[int], List[Tuple[int, str]]]:
+    """
+    validate_rows для рабочего процесса ProcessPoolExecutor: отпечатки строк
+    вычисляются там же и возвращаются вместе с моделями (cached_property).
+    """
+    result = validate_rows(columns, rows, row_numbers)
+    for model in result[0]:
+        model.precompute_fingerprint()
+    return result
 
-    for field in numeric_fields:
-        if field in df_clean.columns:
-            df_clean[field] = pd.to_numeric(df_clean[field], errors='coerce')
 
-    # Обрабатываем даты
-    date_columns = ['Дата обновления информации по благонадежности']
-    for col in date_columns:
-        if col in df_clean.columns:
-            df_clean[col] = pd.to_datetime(df_clean[col], errors='coerce', dayfirst=True).dt.date
+def log_validation(models: List[CounterpartyModel], skipped: List[int], errors: List[Tuple[int, str]], total: int) -> None:
+    """Выводит итоги validate_rows: пропущенные строки, ошибки по строкам и число моделей."""
+    if skipped:
+        print(f"Пропущено строк без ID: {len(skipped)} (строки: {skipped[:50]})")
+    for row_number, message in errors:
+        print(f"Ошибка в строке {row_number}: {message}")
+    print(f"Успешно создано: {len(models)} моделей из {total} строк")
 
-    # Преобразуем каждую строку
-    for index, row in df_clean.iterrows():
-        try:
-            # Преобразуем строку в словарь, заменяя оставшиеся NaN на None
-            row_dict = {}
-            for col, value in row.items():
-                if pd.isna(value):
-                    row_dict[col] = None
-                elif isinstance(value, float) and pd.notnull(value):
-                    # Для float, которые могут быть int
-                    if col == '№':
-                        row_dict[col] = int(value) if value == int(value) else value
-                    else:
-                        row_dict[col] = value
-                else:
-                    row_dict[col] = value
-
-            # Пропускаем строки без ID (они не имеют смысла)
-            if row_dict.get('№') is None:
-                print(f"Пропущена строка {index + 2}: нет ID")
-                continue
-
-            # Создаем модель
-            model = CounterpartyModel(**row_dict)
-            models.append(model)
-
-        except Exception as e:
-            # Более детальная информация об ошибке
-            row_id = row.get('№', f'строка_{index + 2}')
-            print(f"Ошибка в строке {row_id}: {type(e).__name__}: {e}")
-            print(f"Данные строки: {row.to_dict()}")
-            continue
 
-    print(f"Успешно создано: {len(models)} моделей из {len(df)} строк")
-    return models
\ No newline at end of file
+def rows_to_models(
+        columns: List[str],
+        rows: List[List[Any]],
+        row_numbers: Optional[Iterable[int]] = None,
+) -> List[CounterpartyModel]:
+    """
+    Преобразует строки листа в модели (validate_rows). Строки без ID и с ошибками
+    пропускаются, их номера в листе выводятся в лог.
+    """
+    models, skipped, errors = validate_rows(columns, rows, row_numbers)
+    log_validation(models, skipped, errors, len(rows))
+    return models
@@ -0,0 +1,58 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from .googlesheet import GoogleSheetParams, SyncReport
+
+
+class SyncDirection(str, Enum):
+    SHEET_TO_DB = "sheet_to_db"
+    DB_TO_SHEET = "db_to_sheet"
+
+
+class JobState(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class SyncJobStatus(BaseModel):
+    """Состояние фоновой задачи синхронизации"""
+    id: str
+    direction: SyncDirection
+    spreadsheet: str
+    sheet: str
+    full_refresh: bool = False
+    state: JobState = JobState.PENDING
+    stage: Optional[str] = None
+    rows_processed: int = 0
+    report: Optional[SyncReport] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration: Optional[float] = None
+
+
+class SyncBatchRequest(BaseModel):
+    """Синхронизация нескольких листов одним запросом"""
+    direction: SyncDirection
+    targets: List[GoogleSheetParams] = Field(..., min_length=1)
+
+
+class SyncBatchStatus(BaseModel):
+    """Состояние пакета задач синхронизации: общее время и задачи по каждому листу"""
+    id: str
+    direction: SyncDirection
+    state: JobState
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # время от старта первой задачи до завершения последней
+    duration: Optional[float] = None
+    # сумма длительностей задач - сколько заняла бы последовательная синхронизация
+    jobs_duration: Optional[float] = None
+    jobs: List[SyncJobStatus]
@@ -1,5 +1,9 @@
 from .googlesheet import GoogleSheetService
+from .jobs import SyncJobManager
+from .push import SheetPushWorker
 
 __all__ = [
-    'GoogleSheetService'
+    'GoogleSheetService',
+    'SyncJobManager',
+    'SheetPushWorker'
 ]
\ No newline at end of file
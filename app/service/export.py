@@ -0,0 +1,59 @@
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Iterable, List, Sequence
+
+from app.database.repositories import GoogleSheetRepository
+from app.models import CounterpartyModel
+from app.models.export import ExportFormat
+from app.infrastructure.counterparty_cache import dumps_json
+from app.infrastructure.metrics import DB_ROWS
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+
+def _csv_chunk(rows: Iterable[Sequence]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(['' if value is None else value for value in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_chunk(columns: Sequence[str], rows: Iterable[Sequence]) -> bytes:
+    return b"".join(dumps_json(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+async def export_counterparties(
+        repository: GoogleSheetRepository,
+        export_format: ExportFormat,
+        compress: bool = False,
+        batch_size: int = 2000,
+) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка test.test_table в CSV (с заголовком) или NDJSON.
+
+    Строки читаются серверным курсором пачками по batch_size и сразу
+    отдаются клиенту, поэтому память не зависит от размера таблицы. При
+    compress поток сжимается gzip, каждая пачка сбрасывается в выход сразу.
+    """
+    columns: List[str] = list(CounterpartyModel.DB_FIELDS)
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def encode(chunk: bytes) -> bytes:
+        if compressor is None:
+            return chunk
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    if export_format == ExportFormat.CSV:
+        # заголовок уходит сразу, до первой пачки из БД
+        yield encode(_csv_chunk([columns]))
+    async for batch in repository.iter_suppliers_data(columns, batch_size=batch_size):
+        DB_ROWS.labels("read").inc(len(batch))
+        if export_format == ExportFormat.CSV:
+            yield encode(_csv_chunk(batch))
+        else:
+            yield encode(_ndjson_chunk(columns, batch))
+    if compressor is not None:
+        yield compressor.flush()
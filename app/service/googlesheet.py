@@ -1,95 +1,231 @@
+import asyncio
 import datetime
-from pprint import pprint
-from typing import List, Dict, Any
+from typing import List, AsyncIterator, Optional
 
 from app.infrastructure.googlesheet import PCGoogleSheet
 from app.models import GoogleSheetParams #GoogleSheetData
-from app.database.repositories import GoogleSheetRepository
-from app.models import GoogleSheetParams
-from app.models.googlesheet import dataframe_to_models
+from app.database.repositories import GoogleSheetRepository, SheetCheckpointRepository
+from app.models import GoogleSheetParams, SyncReport, CounterpartyModel
+from app.models.googlesheet import log_validation, rows_to_models, validate_shard, SHEET_FIELD_MAPPING
+from app.service.jobs import ProgressCallback
+from app.infrastructure.counterparty_cache import CounterpartyCache
+from app.infrastructure.executor import run_in_process
+from app.infrastructure.metrics import DB_ROWS, track_stage
 from config import settings
 
+
+def _no_progress(stage: str, rows: int = 0) -> None:
+    pass
+
+
+async def _run_stages(*stages) -> None:
+    """
+    Запускает этапы конвейера параллельно. При ошибке одного этапа остальные
+    отменяются, а исходное исключение пробрасывается дальше.
+    """
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 class GoogleSheetService:
     def __init__(
             self,
             google_sheet_repository: GoogleSheetRepository,
+            checkpoint_repository: Optional[SheetCheckpointRepository] = None,
+            counterparty_cache: Optional[CounterpartyCache] = None,
     ):
         self.gs_connect = PCGoogleSheet
         self.google_sheet_repository = google_sheet_repository
+        # журнал пачек записи в лист; без него используется журнал в памяти процесса
+        self.checkpoint_repository = checkpoint_repository
+        # кэш API чтения контрагентов, обновляется после синхронизации лист -> БД
+        self.counterparty_cache = counterparty_cache
 
-    async def add_suppliers_data_in_db(self, gs_params: GoogleSheetParams):
-
-        suppliers_data = self.gs_connect(
-            sheet = gs_params.sheet, spreadsheet = gs_params.spreadsheet, creds_json = settings.CREDS
-        ).get_suppliers_data()
-        data = dataframe_to_models(suppliers_data)
-
-        for v in data:
-            pprint(v.model_dump())
-
-        print(len(data))
-        add_suppliers_data = await self.google_sheet_repository.add_suppliers_data(data)
-
-
-    async def get_suppliers_data_from_db(self, gs_params: GoogleSheetParams):
-        suppliers_data = await self.google_sheet_repository.get_suppliers_data()
-        update_data = self.prepare_data_for_wild_insert(db_data=suppliers_data)
-        pprint(update_data)
-
-        await self.gs_connect(
-            sheet = gs_params.sheet, spreadsheet = gs_params.spreadsheet, creds_json = settings.CREDS
-        ).update_revenue_rows(update_data,table_id="№" )
+    async def add_suppliers_data_in_db(
+            self,
+            gs_params: GoogleSheetParams,
+            progress: ProgressCallback = _no_progress,
+    ) -> SyncReport:
+        """
+        Синхронизация лист -> БД. В репозиторий отправляются только новые строки
+        и строки, отпечаток которых отличается от сохраненного в test.test_table.
+
+        Лист обрабатывается окнами по settings.GS_READ_PAGE_ROWS строк тремя
+        параллельными этапами: пока окно N+1 читается из листа, окно N проверяется
+        и сравнивается с БД, а изменения окна N-1 записываются в БД. Этапы связаны
+        очередями на одно окно, поэтому в памяти одновременно находится не больше
+        нескольких окон, а не весь лист.
+        """
+        with track_stage("sheet_to_db", "total"):
+            progress("connect", 0)
+            with track_stage("sheet_to_db", "connect"):
+                gs_client = await self.gs_connect.create(
+                    sheet = gs_params.sheet, spreadsheet = gs_params.spreadsheet, creds_json = settings.CREDS
+                )
+
+            report = SyncReport()
+            windows: asyncio.Queue = asyncio.Queue(maxsize=1)
+            upserts: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+            columns = list(SHEET_FIELD_MAPPING.values())
+
+            async def fetch():
+                progress("fetch_sheet", 0)
+                async for window in gs_client.iter_suppliers_data(columns):
+                    await windows.put(window)
+                await windows.put(None)
+
+            async def validate():
+                while (window := await windows.get()) is not None:
+                    start, rows = window
+                    with track_stage("sheet_to_db", "validate"):
+                        data = await self._validate_window(columns, rows, start)
+                    del window, rows
+                    changed = await self._changed_models(data, report)
+                    await upserts.put((changed, len(data)))
+                await upserts.put(None)
+
+            async def upsert():
+                while (item := await upserts.get()) is not None:
+                    changed, rows = item
+                    if changed:
+                        with track_stage("sheet_to_db", "upsert"):
+                            await self.google_sheet_repository.add_suppliers_data(changed)
+                        DB_ROWS.labels("write").inc(len(changed))
+                    progress("upsert", rows)
+
+            await _run_stages(fetch(), validate(), upsert())
+            print(f"Новых: {report.inserted}, изменено: {report.updated}, без изменений: {report.unchanged}")
+            if self.counterparty_cache is not None and (report.inserted or report.updated):
+                progress("refresh_cache", 0)
+                await self.counterparty_cache.refresh(self.google_sheet_repository)
+            progress("done", 0)
+        return report
 
     @staticmethod
-    def prepare_data_for_wild_insert(
-            db_data: List[Dict[str, Any]],
-            key_field: str = "id"
-    ) -> Dict[str, Dict[str, Any]]:
+    async def _validate_window(columns: List[str], rows: List[List[str]], start: int) -> List[CounterpartyModel]:
         """
-        Простая версия преобразования данных
+        Проверка окна строк листа. При settings.VALIDATION_PROCESSES > 0 окно делится
+        на части и проверяется параллельно в пуле процессов, не занимая event loop;
+        модели и ошибки по строкам собираются в исходном порядке.
         """
-
-        FIELD_MAPPING = {
-            'id': '№',
-            'name': 'Наименование',
-            'inn': 'ИНН',
-            'contact_info': 'Контактные данные',
-            'comment': 'Комментарий',
-            'reliability_update_date': 'Дата обновления информации по благонадежности',
-            'opf': 'ОПФ',
-            'supplier_category': 'Категория поставщика',
-            'country': 'Страна',
-            'tax_system': 'Система налогообложения',
-            'reliability_level': 'Уровень благонадежности',
-            'edo_operator': 'Оператор ЭДО',
-            'responsible_person': 'Ответственное лицо',
-            'statutory_documents_link': 'Ссылка на уставные/личные документы',
-            'ka_guarantee_letter': 'Гарантийное письмо КА',
-            'card_details': 'Карточка / реквизиты',
-            'record_sheet_passport': 'Лист записи/Паспорт',
-            'oi_guarantee_letter': 'Гарантийное письмо ОИ',
-            'check_1': 'Проверка',
-            'check_2': 'Проверка №2'
-        }
-
-        result = {}
-
-        for record in db_data:
-            key_value = record.get(key_field)
-            if not key_value:
-                continue
-
-            key = str(key_value)
-            formatted = {}
-
-            for db_field, sheet_header in FIELD_MAPPING.items():
-                value = record.get(db_field)
-                if value is None:
-                    formatted[sheet_header] = ''
+        row_numbers = list(range(start, start + len(rows)))
+        processes = settings.VALIDATION_PROCESSES
+        if processes <= 0:
+            return rows_to_models(columns, rows, row_numbers)
+
+        shards = max(1, min(processes, len(rows) // max(settings.VALIDATION_MIN_SHARD_ROWS, 1)))
+        size = -(-len(rows) // shards)
+        results = await asyncio.gather(*(
+            run_in_process(validate_shard, columns, rows[offset:offset + size], row_numbers[offset:offset + size])
+            for offset in range(0, len(rows), size)
+        ))
+        models, skipped, errors = [], [], []
+        for shard_models, shard_skipped, shard_errors in results:
+            models.extend(shard_models)
+            skipped.extend(shard_skipped)
+            errors.extend(shard_errors)
+        log_validation(models, skipped, errors, len(rows))
+        return models
+
+    async def _changed_models(self, data: List[CounterpartyModel], report: SyncReport) -> List[CounterpartyModel]:
+        """Сравнивает окно моделей с отпечатками в БД, обновляет счетчики report, возвращает новые и измененные."""
+        with track_stage("sheet_to_db", "compare"):
+            db_hashes = await self.google_sheet_repository.get_row_hashes([model.id for model in data])
+            DB_ROWS.labels("read").inc(len(db_hashes))
+            report.total += len(data)
+            changed = []
+            for model in data:
+                if model.id not in db_hashes:
+                    report.inserted += 1
+                elif db_hashes[model.id] != model.fingerprint:
+                    report.updated += 1
                 else:
-                    # Просто преобразуем в строку
-                    formatted[sheet_header] = str(value).strip()
+                    report.unchanged += 1
+                    continue
+                changed.append(model)
+        return changed
 
-            result[key] = formatted
+    async def get_suppliers_data_from_db(
+            self,
+            gs_params: GoogleSheetParams,
+            progress: ProgressCallback = _no_progress,
+            ids: Optional[List[int]] = None,
+    ) -> Optional[SyncReport]:
+        """
+        Выгрузка БД -> лист. Строки читаются из БД пачками только по колонкам,
+        которые есть в листе, и сразу передаются в потоковую запись PCGoogleSheet.
+
+        Выгружаются только строки, измененные после отметки прошлой выгрузки в этот
+        лист; отметка сдвигается после успешной записи. При gs_params.full_refresh
+        (и при первой выгрузке в лист) выгружается вся таблица.
 
-        return result
\ No newline at end of file
+        С ids выгружаются только строки с этими id (отправка изменений из
+        SheetPushWorker), отметка выгрузки при этом не меняется.
+        """
+        with track_stage("db_to_sheet", "total"):
+            progress("connect", 0)
+            with track_stage("db_to_sheet", "connect"):
+                gs_client = await self.gs_connect.create(
+                    sheet = gs_params.sheet, spreadsheet = gs_params.spreadsheet, creds_json = settings.CREDS
+                )
+                headers, header_map = await gs_client.get_headers()
+            fields = [
+                field for field in CounterpartyModel.DB_FIELDS if SHEET_FIELD_MAPPING[field] in header_map
+            ]
+            table_id = SHEET_FIELD_MAPPING["id"]
+            if "id" not in fields:
+                print(f"Колонка {table_id} не найдена в таблице")
+                return None
+
+            repository = self.google_sheet_repository
+            changed_since = exported_until = None
+            if ids is not None:
+                print(f"Выгрузка: {len(ids)} измененных строк")
+            elif not gs_params.full_refresh:
+                watermark = await repository.get_export_watermark(gs_params.spreadsheet, gs_params.sheet)
+                if watermark is not None:
+                    changed_since = watermark - datetime.timedelta(seconds=settings.EXPORT_WATERMARK_OVERLAP)
+            if ids is None:
+                # новая отметка берется до чтения: строки, измененные во время выгрузки
+                # или в еще открытых транзакциях, попадут и в следующую
+                exported_until = await repository.get_export_horizon()
+                print("Выгрузка: все строки" if changed_since is None else f"Выгрузка: строки, измененные с {changed_since}")
+
+            progress("export", 0)
+            counts = await gs_client.sync_rows(
+                columns=[SHEET_FIELD_MAPPING[field] for field in fields],
+                batches=self.sheet_row_batches(fields, progress, changed_since, ids),
+                table_id=table_id,
+                checkpoint=self.checkpoint_repository,
+            )
+            if exported_until is not None:
+                await repository.set_export_watermark(gs_params.spreadsheet, gs_params.sheet, exported_until)
+            progress("done", 0)
+        return SyncReport(**counts)
+
+    async def sheet_row_batches(
+            self,
+            fields: List[str],
+            progress: ProgressCallback = _no_progress,
+            changed_since: Optional[datetime.datetime] = None,
+            ids: Optional[List[int]] = None,
+    ) -> AsyncIterator[List[List[str]]]:
+        """Пачки строк из БД, готовые к записи в лист (значения в порядке fields)."""
+        async for batch in self.google_sheet_repository.iter_suppliers_data(
+                fields, batch_size=settings.EXPORT_BATCH_SIZE, changed_since=changed_since, ids=ids
+        ):
+            progress("export", len(batch))
+            DB_ROWS.labels("read").inc(len(batch))
+            yield [
+                ['' if value is None else str(value).strip() for value in record]
+                for record in batch
+            ]
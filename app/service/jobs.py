@@ -0,0 +1,178 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.models import GoogleSheetParams, JobState, SyncBatchStatus, SyncDirection, SyncJobStatus, SyncReport
+
+# Колбэк прогресса: (этап, число обработанных строк)
+ProgressCallback = Callable[[str, int], None]
+JobKey = Tuple[str, str, SyncDirection]
+SyncRunner = Callable[[ProgressCallback], Awaitable[Optional[SyncReport]]]
+
+
+class SyncJobManager:
+    """
+    Внутрипроцессная очередь фоновых задач синхронизации.
+
+    Одновременно для одной пары (spreadsheet, sheet) и направления выполняется
+    не больше одной задачи: повторный запрос получает уже запущенную. Запрос
+    полной выгрузки (full_refresh) во время обычной не отбрасывается, а ставится
+    следом за ней.
+    Всего одновременно выполняется не больше max_concurrent задач, остальные
+    ждут в состоянии pending.
+    """
+
+    def __init__(self, history_size: int = 500, max_concurrent: int = 4):
+        self.history_size = history_size
+        self._jobs: "OrderedDict[str, SyncJobStatus]" = OrderedDict()
+        self._active: Dict[JobKey, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._batches: "OrderedDict[str, Tuple[SyncDirection, datetime, List[str]]]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+
+    def submit(
+            self,
+            gs_params: GoogleSheetParams,
+            direction: SyncDirection,
+            run: Callable[[ProgressCallback], Awaitable[Optional[SyncReport]]],
+    ) -> Tuple[SyncJobStatus, bool]:
+        """
+        Ставит задачу в очередь. Возвращает (задача, создана ли новая).
+        """
+        key = (gs_params.spreadsheet, gs_params.sheet, direction)
+        active_id = self._active.get(key)
+        previous = None
+        if active_id is not None:
+            active = self._jobs[active_id]
+            if active.full_refresh or not gs_params.full_refresh:
+                return active, False
+            previous = self._tasks.get(active_id)
+
+        job = SyncJobStatus(
+            id=uuid.uuid4().hex,
+            direction=direction,
+            spreadsheet=gs_params.spreadsheet,
+            sheet=gs_params.sheet,
+            full_refresh=gs_params.full_refresh,
+            created_at=datetime.now(),
+        )
+        self._jobs[job.id] = job
+        self._active[key] = job.id
+        self._tasks[job.id] = asyncio.create_task(self._run(job, key, run, previous))
+        self._trim_history()
+        return job, True
+
+    def get(self, job_id: str) -> Optional[SyncJobStatus]:
+        return self._jobs.get(job_id)
+
+    def submit_batch(
+            self,
+            direction: SyncDirection,
+            targets: Sequence[Tuple[GoogleSheetParams, SyncRunner]],
+    ) -> SyncBatchStatus:
+        """
+        Ставит в очередь синхронизацию нескольких листов. Задачи выполняются
+        параллельно в пределах общего ограничения max_concurrent.
+        """
+        job_ids = [self.submit(gs_params, direction, run)[0].id for gs_params, run in targets]
+        batch_id = uuid.uuid4().hex
+        self._batches[batch_id] = (direction, datetime.now(), job_ids)
+        while len(self._batches) > self.history_size:
+            self._batches.popitem(last=False)
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id: str) -> Optional[SyncBatchStatus]:
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            return None
+        direction, created_at, job_ids = batch
+        jobs = [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+        states = {job.state for job in jobs}
+        if states == {JobState.PENDING}:
+            state = JobState.PENDING
+        elif states & {JobState.PENDING, JobState.RUNNING}:
+            state = JobState.RUNNING
+        else:
+            state = JobState.FAILED if JobState.FAILED in states else JobState.SUCCEEDED
+        started = [job.started_at for job in jobs if job.started_at is not None]
+        finished = [job.finished_at for job in jobs if job.finished_at is not None]
+        finished_at = max(finished) if finished and state in (JobState.SUCCEEDED, JobState.FAILED) else None
+        return SyncBatchStatus(
+            id=batch_id,
+            direction=direction,
+            state=state,
+            created_at=created_at,
+            started_at=min(started) if started else None,
+            finished_at=finished_at,
+            duration=round((finished_at - min(started)).total_seconds(), 3) if finished_at and started else None,
+            jobs_duration=round(sum(job.duration or 0 for job in jobs), 3),
+            jobs=jobs,
+        )
+
+    async def wait(self, job_id: str) -> Optional[SyncJobStatus]:
+        """Дожидается завершения задачи (отмена ожидания не отменяет саму задачу)."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.wait([task])
+        return self._jobs.get(job_id)
+
+    async def _run(
+            self,
+            job: SyncJobStatus,
+            key: JobKey,
+            run: Callable[[ProgressCallback], Awaitable[Optional[SyncReport]]],
+            previous: Optional[asyncio.Task] = None,
+    ) -> None:
+        def progress(stage: str, rows: int = 0) -> None:
+            job.stage = stage
+            job.rows_processed += rows
+
+        started = None
+        try:
+            if previous is not None:
+                # тот же лист пишет предыдущая задача - ждем ее завершения
+                await asyncio.wait([previous])
+            async with self._slots:
+                job.state = JobState.RUNNING
+                job.started_at = datetime.now()
+                started = time.monotonic()
+                job.report = await run(progress)
+                job.state = JobState.SUCCEEDED
+        except asyncio.CancelledError:
+            job.state = JobState.FAILED
+            job.error = "Задача отменена"
+            raise
+        except Exception as e:
+            print(f"Задача {job.id} ({job.direction.value}) завершилась ошибкой: {type(e).__name__}: {e}")
+            job.state = JobState.FAILED
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = datetime.now()
+            if started is not None:
+                job.duration = round(time.monotonic() - started, 3)
+            if self._active.get(key) == job.id:
+                self._active.pop(key)
+            self._tasks.pop(job.id, None)
+
+    def _trim_history(self) -> None:
+        while len(self._jobs) > self.history_size:
+            job_id, job = next(iter(self._jobs.items()))
+            if job_id in self._tasks:
+                # незавершенные задачи не вытесняем
+                break
+            self._jobs.popitem(last=False)
+
+    async def shutdown(self) -> None:
+        """Отменяет незавершенные задачи при остановке приложения."""
+        pending = dict(self._tasks)
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+        for job_id in pending:
+            job = self._jobs[job_id]
+            if job.state in (JobState.PENDING, JobState.RUNNING):
+                job.state = JobState.FAILED
+                job.error = "Задача отменена"
@@ -0,0 +1,144 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from asyncpg import Connection
+
+from app.database.db_connect import connect_db
+from app.database.schema import CHANGES_CHANNEL
+from app.models import GoogleSheetParams, JobState, SyncDirection
+from app.models.googlesheet import ID_HEADER
+from app.service.googlesheet import GoogleSheetService
+from app.service.jobs import SyncJobManager
+
+# Лист для отправки изменений: (spreadsheet, sheet)
+PushTarget = Tuple[str, str]
+
+
+class SheetPushWorker:
+    """
+    Фоновая отправка изменений test.test_table в листы.
+
+    Слушает канал CHANGES_CHANNEL (его наполняет триггер на test.test_table),
+    копит id измененных строк, пока изменения идут чаще debounce секунд (но не
+    дольше max_delay от первого изменения), и отправляет в каждый лист только
+    эти строки одной выгрузкой. Выгрузки идут через SyncJobManager, поэтому не
+    пересекаются с выгрузками, запущенными через API, и видны в /jobs.
+
+    Если соединение LISTEN оборвалось, уведомления за это время потеряны: после
+    переподключения выполняется обычная инкрементальная выгрузка по отметке.
+    """
+
+    def __init__(
+            self,
+            service: GoogleSheetService,
+            sync_jobs: SyncJobManager,
+            targets: Sequence[PushTarget],
+            debounce: float = 2.0,
+            max_delay: float = 10.0,
+            retry_delay: float = 30.0,
+    ):
+        self.service = service
+        self.sync_jobs = sync_jobs
+        self.targets = [tuple(target) for target in targets]
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self._pending: Dict[PushTarget, Set[int]] = {target: set() for target in self.targets}
+        self._resync: Set[PushTarget] = set()
+        self._changed = asyncio.Event()
+        self._conn: Optional[Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self._listen()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+    async def _listen(self) -> None:
+        self._conn = await connect_db()
+        await self._conn.add_listener(CHANGES_CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            row_id = int(payload)
+        except ValueError:
+            return
+        for pending in self._pending.values():
+            pending.add(row_id)
+        self._changed.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.retry_delay)
+            except asyncio.TimeoutError:
+                await self._check_connection()
+                if not self._resync:
+                    continue
+            first = loop.time()
+            # ждем паузы в изменениях, чтобы отправить их одной выгрузкой
+            while True:
+                self._changed.clear()
+                remaining = self.max_delay - (loop.time() - first)
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=min(self.debounce, remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush()
+
+    async def _check_connection(self) -> None:
+        if self._conn is not None and not self._conn.is_closed():
+            return
+        try:
+            await self._listen()
+        except Exception as e:
+            print(f"Не удалось восстановить LISTEN {CHANGES_CHANNEL}: {type(e).__name__}: {e}")
+            return
+        print(f"LISTEN {CHANGES_CHANNEL} восстановлен, листы будут выгружены по отметке")
+        self._resync.update(self.targets)
+
+    async def _flush(self) -> None:
+        results = await asyncio.gather(*(self._push(target) for target in self.targets))
+        if not all(results):
+            # неотправленные id остались в очереди, повтор - после паузы
+            await asyncio.sleep(self.retry_delay)
+            self._changed.set()
+
+    async def _push(self, target: PushTarget) -> bool:
+        pending = self._pending[target]
+        resync = target in self._resync
+        if not pending and not resync:
+            return True
+        ids: Optional[List[int]] = None if resync else sorted(pending)
+        self._resync.discard(target)
+        pending.clear()
+
+        spreadsheet, sheet = target
+        params = GoogleSheetParams(spreadsheet=spreadsheet, sheet=sheet, table_id_header=ID_HEADER)
+        while True:
+            job, created = self.sync_jobs.submit(
+                params,
+                SyncDirection.DB_TO_SHEET,
+                lambda progress: self.service.get_suppliers_data_from_db(params, progress, ids=ids),
+            )
+            job = await self.sync_jobs.wait(job.id)
+            if created:
+                break
+            # шла выгрузка в этот лист, запущенная через API: после нее отправляем свои строки
+
+        if job.state == JobState.SUCCEEDED:
+            return True
+        if ids is None:
+            self._resync.add(target)
+        else:
+            pending.update(ids)
+        return False
@@ -0,0 +1,70 @@
+import random
+from datetime import date, timedelta
+from typing import List
+
+from app.models.googlesheet import SHEET_FIELD_MAPPING
+
+# Колонки листа, которые сервис не маппит - в реальных таблицах их много
+EXTRA_HEADERS = ["Примечание бухгалтерии", "Сумма договора", "Статус сверки", "Менеджер", "Регион"]
+
+_OPF = ["ООО", "АО", "ИП", "ПАО", "ЗАО"]
+_CATEGORIES = ["Поставщик", "Подрядчик", "Перевозчик", "Услуги"]
+_COUNTRIES = ["Россия", "Казахстан", "Беларусь", "Китай"]
+_TAX = ["ОСНО", "УСН", "ПСН", "ЕСХН"]
+_LEVELS = ["Высокий", "Средний", "Низкий"]
+_EDO = ["Контур.Диадок", "СБИС", "Такском", ""]
+_WORDS = ["Ромашка", "Вектор", "Сибирь", "Альфа", "Техно", "Строй", "Агро", "Логистик", "Восток", "Нева"]
+
+
+def generate_headers() -> List[str]:
+    headers = list(SHEET_FIELD_MAPPING.values())
+    # неотображаемые колонки вперемешку с рабочими
+    for offset, extra in enumerate(EXTRA_HEADERS):
+        headers.insert(3 + offset * 4, extra)
+    return headers
+
+
+def _maybe(rnd: random.Random, value: str, blank_rate: float) -> str:
+    return "" if rnd.random() < blank_rate else value
+
+
+def generate_sheet(rows: int, seed: int = 42, blank_rate: float = 0.3) -> List[List[str]]:
+    """
+    Синтетический лист контрагентов: строка заголовков + rows строк.
+
+    Значения - строки, как их возвращает get_all_values: даты дд.мм.гггг,
+    пропуски, лишние пробелы, ID как '12' и иногда '12.0'.
+    """
+    rnd = random.Random(seed)
+    headers = generate_headers()
+    start = date(2019, 1, 1)
+    data = [headers]
+    for i in range(1, rows + 1):
+        name = f'{rnd.choice(_OPF)} "{rnd.choice(_WORDS)}-{rnd.choice(_WORDS)} {i}"'
+        values = {
+            "№": str(i) if rnd.random() > 0.02 else f"{i}.0",
+            "Наименование": name if rnd.random() > 0.05 else f"  {name} ",
+            "ИНН": _maybe(rnd, str(rnd.randrange(10 ** 9, 10 ** 12)), blank_rate / 3),
+            "Контактные данные": _maybe(rnd, f"+7 9{rnd.randrange(10 ** 8, 10 ** 9)}, info{i}@example.ru", blank_rate),
+            "Комментарий": _maybe(rnd, f"Комментарий по контрагенту {i}", blank_rate * 2),
+            "Дата обновления информации по благонадежности": _maybe(
+                rnd, (start + timedelta(days=rnd.randrange(0, 2000))).strftime("%d.%m.%Y"), blank_rate
+            ),
+            "ОПФ": _maybe(rnd, rnd.choice(_OPF), blank_rate / 3),
+            "Категория поставщика": _maybe(rnd, rnd.choice(_CATEGORIES), blank_rate),
+            "Страна": _maybe(rnd, rnd.choice(_COUNTRIES), blank_rate / 3),
+            "Система налогообложения": _maybe(rnd, rnd.choice(_TAX), blank_rate),
+            "Уровень благонадежности": _maybe(rnd, rnd.choice(_LEVELS), blank_rate),
+            "Оператор ЭДО": _maybe(rnd, rnd.choice(_EDO), blank_rate),
+            "Ответственное лицо": _maybe(rnd, f"Иванов И.{rnd.choice('АБВГД')}.", blank_rate),
+            "Ссылка на уставные/личные документы": _maybe(rnd, f"https://drive.example.ru/d/{i}", blank_rate),
+            "Гарантийное письмо КА": _maybe(rnd, rnd.choice(["Да", "Нет"]), blank_rate),
+            "Карточка / реквизиты": _maybe(rnd, f"https://drive.example.ru/c/{i}", blank_rate),
+            "Лист записи/Паспорт": _maybe(rnd, rnd.choice(["Да", "Нет"]), blank_rate),
+            "Гарантийное письмо ОИ": _maybe(rnd, rnd.choice(["Да", "Нет"]), blank_rate),
+            "Проверка": _maybe(rnd, "ОК", blank_rate),
+            "Проверка №2": _maybe(rnd, "ОК", blank_rate),
+            "Сумма договора": _maybe(rnd, f"{rnd.randrange(1000, 10 ** 7)},00", blank_rate),
+        }
+        data.append([values.get(header, _maybe(rnd, "x", 0.8)) for header in headers])
+    return data
@@ -0,0 +1,69 @@
+"""
+Замер холодного старта: время импорта приложения и RSS процесса после импорта.
+
+Каждый замер выполняется в отдельном процессе, результат - медиана запусков.
+
+Пример:
+    python -m benchmarks.imports
+    python -m benchmarks.imports --module app.service --repeat 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_ENV_DEFAULTS = {
+    "POSTGRES_USER": "bench", "POSTGRES_PASSWORD": "bench", "POSTGRES_DB": "bench",
+    "POSTGRES_HOST": "localhost", "POSTGRES_PORT": "5432", "APP_IP_ADDRESS": "127.0.0.1",
+    "APP_PORT": "8000", "INITIAL_SERVICE_TOKEN": "bench", "CREDS": "creds.json",
+}
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def probe(module: str) -> dict:
+    env = {**_ENV_DEFAULTS, **os.environ}
+    code = _PROBE.format(module=module)
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(module: str, repeat: int) -> dict:
+    runs = [probe(module) for _ in range(repeat)]
+    return {
+        "module": module,
+        "seconds": round(statistics.median(run["seconds"] for run in runs), 4),
+        "max_rss_mib": round(statistics.median(run["max_rss_mib"] for run in runs), 1),
+        "modules": runs[0]["modules"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Время импорта и RSS приложения")
+    parser.add_argument("--module", default="main", help="импортируемый модуль (по умолчанию main)")
+    parser.add_argument("--repeat", type=int, default=5, help="число запусков, берется медиана")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.repeat)
+    print(
+        f"{result['module']:<24} {result['seconds']:>8.3f}s {result['max_rss_mib']:>8.1f} MiB RSS "
+        f"{result['modules']:>5} modules"
+    )
+
+
+if __name__ == "__main__":
+    main()
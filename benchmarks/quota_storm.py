@@ -0,0 +1,86 @@
+"""
+Сценарий "шторма квоты": несколько параллельных выгрузок в листы эмулятора
+с ограниченной поминутной квотой, задержкой и случайными 429.
+
+Показывает, сколько запросов дошло до API, сколько получили 429 и сколько
+повторов выполнил ограничитель, и общее время.
+
+Пример:
+    python -m benchmarks.quota_storm --syncs 8 --rows 2000 --quota 120 --latency 0.05 --error-rate 0.05
+"""
+import os
+
+for _name, _value in {
+    "POSTGRES_USER": "bench", "POSTGRES_PASSWORD": "bench", "POSTGRES_DB": "bench",
+    "POSTGRES_HOST": "localhost", "POSTGRES_PORT": "5432", "APP_IP_ADDRESS": "127.0.0.1",
+    "APP_PORT": "8000", "INITIAL_SERVICE_TOKEN": "bench", "CREDS": "creds.json",
+    "GS_BACKOFF_BASE": "0.2", "GS_BACKOFF_MAX": "5",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from app.infrastructure.emulator import SheetsEmulator
+from app.infrastructure.googlesheet import PCGoogleSheet
+from app.infrastructure.rate_limit import SheetsRateLimiter
+from app.infrastructure.registry import SheetRegistry
+from benchmarks.data import generate_sheet
+from config import settings
+
+
+async def storm(syncs: int, rows: int, quota: int, latency: float, error_rate: float, limit: int) -> dict:
+    emulator = SheetsEmulator(latency=latency, error_rate=error_rate, quota_per_minute=quota, seed=1)
+    limiter = SheetsRateLimiter(
+        read_per_minute=limit, write_per_minute=limit, burst=max(1, limit // 6),
+        max_retries=settings.GS_MAX_RETRIES, backoff_base=settings.GS_BACKOFF_BASE,
+        backoff_max=settings.GS_BACKOFF_MAX,
+    )
+    registry = SheetRegistry(limiter=limiter)
+    registry.clients.set(settings.CREDS, emulator.client())
+
+    sheet = generate_sheet(rows)
+    headers = sheet[0]
+    for i in range(syncs):
+        emulator.add_worksheet("storm", f"sheet-{i}", sheet)
+    # каждая выгрузка меняет 1% строк своего листа
+    data_json = {
+        row[0]: {headers[1]: f"{row[1]} (изм.)"} for row in sheet[1::100]
+    }
+
+    async def one(i: int):
+        client = await PCGoogleSheet.create("storm", f"sheet-{i}", settings.CREDS, registry=registry)
+        await client.update_revenue_rows(data_json, table_id="№")
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = await asyncio.gather(*(one(i) for i in range(syncs)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "syncs": syncs,
+        "failed": sum(isinstance(r, Exception) for r in results),
+        "seconds": round(elapsed, 2),
+        "emulator": emulator.stats(),
+        "limiter": limiter.state(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Параллельные выгрузки в эмулятор с ограниченной квотой")
+    parser.add_argument("--syncs", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--quota", type=int, default=120, help="квота эмулятора, запросов в минуту (0 - без квоты)")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка эмулятора на вызов, сек")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="доля случайных 429")
+    parser.add_argument("--limit", type=int, default=600, help="лимит ограничителя, запросов в минуту")
+    args = parser.parse_args()
+    result = asyncio.run(storm(args.syncs, args.rows, args.quota, args.latency, args.error_rate, args.limit))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
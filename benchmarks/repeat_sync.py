@@ -0,0 +1,90 @@
+"""
+Повторные выгрузки БД -> лист подряд: размер листа и запросы к API от запуска к запуску.
+
+Ключи в листе записаны так, как их может показывать Google Sheets ("12.0", " 12 ",
+"1 234"), а из БД приходят как "12". В устойчивом состоянии лист не растет,
+а число записанных ячеек пропорционально числу измененных в БД строк.
+
+Пример:
+    python -m benchmarks.repeat_sync --rows 10000 --runs 5 --changed 0.01
+"""
+import os
+
+for _name, _value in {
+    "POSTGRES_USER": "bench", "POSTGRES_PASSWORD": "bench", "POSTGRES_DB": "bench",
+    "POSTGRES_HOST": "localhost", "POSTGRES_PORT": "5432", "APP_IP_ADDRESS": "127.0.0.1",
+    "APP_PORT": "8000", "INITIAL_SERVICE_TOKEN": "bench", "CREDS": "creds.json",
+    "GS_READ_REQUESTS_PER_MINUTE": "1000000000", "GS_WRITE_REQUESTS_PER_MINUTE": "1000000000",
+    "GS_RATE_BURST": "1000000000",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from collections import Counter
+
+from app.infrastructure.emulator import EmulatedWorksheet
+from app.models import CounterpartyModel, GoogleSheetParams
+from app.models.googlesheet import rows_to_models
+from app.service.googlesheet import GoogleSheetService
+from benchmarks.data import generate_sheet
+from benchmarks.run import _ClientFactory, _RecordsRepository, _sheet_client
+
+_COMMENT = CounterpartyModel.DB_FIELDS.index("comment")
+
+
+def _sheet_key(rnd: random.Random, key: str) -> str:
+    """Ключ так, как его может отдать лист для числовой ячейки."""
+    value = int(float(key))
+    return rnd.choice([str(value), f"{value}.0", f" {value} ", f"{value:,}".replace(",", " ")])
+
+
+async def repeat(rows: int, runs: int, changed: float) -> None:
+    rnd = random.Random(5)
+    sheet = generate_sheet(rows)
+    records = [model.db_values() for model in rows_to_models(sheet[0], sheet[1:])]
+    for row in sheet[1:]:
+        row[0] = _sheet_key(rnd, row[0])
+
+    worksheet = EmulatedWorksheet(sheet)
+    client = _sheet_client(worksheet, rows)
+    service = GoogleSheetService(_RecordsRepository(records, 2000))
+    service.gs_connect = _ClientFactory(client)
+    params = GoogleSheetParams(spreadsheet="benchmark", sheet="repeat", table_id_header="№")
+
+    print(f"{'запуск':>6} {'строк в листе':>14} {'сек':>8} {'вызовов':>8} {'ячеек записано':>15}  отчет")
+    for run in range(1, runs + 1):
+        if run > 1:
+            # между запусками в БД меняется доля строк
+            for position in rnd.sample(range(len(records)), max(1, int(len(records) * changed))):
+                record = list(records[position])
+                record[_COMMENT] = f"Изменено в запуске {run}"
+                records[position] = tuple(record)
+        calls_before = Counter(worksheet.calls)
+        cells_before = worksheet.cells_written
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = await service.get_suppliers_data_from_db(params)
+        elapsed = time.perf_counter() - started
+        calls = Counter(worksheet.calls) - calls_before
+        print(
+            f"{run:>6} {len(worksheet.rows) - 1:>14} {elapsed:>8.3f} {sum(calls.values()):>8} "
+            f"{worksheet.cells_written - cells_before:>15}  {report.model_dump()} {dict(calls)}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Повторные выгрузки БД -> лист")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--changed", type=float, default=0.01, help="доля строк БД, меняющихся между запусками")
+    args = parser.parse_args()
+    asyncio.run(repeat(args.rows, args.runs, args.changed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import List, Optional, Tuple
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,6 +16,73 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     CREDS: str
 
+    # Пул соединений asyncpg: размер, число запросов до переоткрытия соединения
+    # и время (сек), после которого простаивающее соединение закрывается (0 - не закрывать)
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_MAX_QUERIES: int = 50000
+    DB_POOL_MAX_INACTIVE_LIFETIME: float = 300.0
+    # statement_timeout сервера, мс (0 - без ограничения), и таймаут запроса на клиенте, сек
+    DB_STATEMENT_TIMEOUT_MS: int = 120000
+    DB_COMMAND_TIMEOUT: Optional[float] = None
+
+    # Google Sheets: размер пула потоков для блокирующих вызовов gspread
+    GS_MAX_WORKERS: int = 8
+    # Кэш клиентов, открытых листов и заголовков: время жизни (сек) и размер
+    GS_CACHE_TTL: int = 3600
+    GS_CACHE_MAXSIZE: int = 128
+    # Ограничения одного вызова batch_update: число ячеек и диапазонов
+    GS_BATCH_MAX_CELLS: int = 20000
+    GS_BATCH_MAX_RANGES: int = 1000
+    # Размер страницы (строк) при постраничном чтении нужных колонок через batch_get
+    GS_READ_PAGE_ROWS: int = 5000
+    # Квоты Sheets API (запросов в минуту на пользователя) и повторы при временных ошибках
+    GS_READ_REQUESTS_PER_MINUTE: int = 60
+    GS_WRITE_REQUESTS_PER_MINUTE: int = 60
+    GS_RATE_BURST: int = 10
+    GS_MAX_RETRIES: int = 8
+    GS_BACKOFF_BASE: float = 1.0
+    GS_BACKOFF_MAX: float = 64.0
+    # Сколько раз продолжать запись с неприменной пачки после исчерпания повторов ограничителя
+    GS_WRITE_RESUME_ATTEMPTS: int = 3
+
+    # Бэкенд Google Sheets: "google" или "emulator" (локальный эмулятор для нагрузочных тестов)
+    GS_BACKEND: str = "google"
+    GS_EMULATOR_LATENCY: float = 0.0
+    GS_EMULATOR_ERROR_RATE: float = 0.0
+    GS_EMULATOR_QUOTA_PER_MINUTE: int = 0
+    GS_EMULATOR_RETRY_AFTER: Optional[float] = None
+    GS_EMULATOR_DATA: Optional[str] = None
+
+    # Проверка строк листа в пуле процессов: число процессов (0 - в основном процессе)
+    # и минимальный размер части окна, отправляемой в один процесс
+    VALIDATION_PROCESSES: int = 0
+    VALIDATION_MIN_SHARD_ROWS: int = 1000
+
+    # С какого числа строк upsert контрагентов идет через COPY во временную таблицу
+    BULK_UPSERT_THRESHOLD: int = 1000
+    # Размер пачки строк при потоковой выгрузке БД -> лист
+    EXPORT_BATCH_SIZE: int = 2000
+    # Запас к отметке инкрементальной выгрузки, сек. Отметка - начало самой старой
+    # открытой транзакции (см. get_export_horizon); запас нужен только для транзакций,
+    # невидимых в pg_stat_activity (чужие роли без pg_read_all_stats), и покрывает
+    # транзакции не длиннее него
+    EXPORT_WATERMARK_OVERLAP: int = 60
+    # Сколько синхронизаций листов (задач SyncJobManager) выполняется одновременно
+    SYNC_MAX_CONCURRENCY: int = 4
+    # Кэш контрагентов API чтения: через сколько секунд снимок перечитывается в фоне
+    COUNTERPARTY_CACHE_TTL: int = 300
+
+    # Фоновая отправка изменений test.test_table в листы по LISTEN/NOTIFY
+    SHEET_PUSH_ENABLED: bool = False
+    # Листы для отправки, JSON: [["spreadsheet", "sheet"], ...]
+    SHEET_PUSH_TARGETS: List[Tuple[str, str]] = []
+    # Отправка после паузы в изменениях (сек), но не позже SHEET_PUSH_MAX_DELAY от первого изменения
+    SHEET_PUSH_DEBOUNCE: float = 2.0
+    SHEET_PUSH_MAX_DELAY: float = 10.0
+    # Пауза перед повтором неудачной отправки и проверки соединения LISTEN, сек
+    SHEET_PUSH_RETRY_DELAY: float = 30.0
+
 
 settings: Settings = Settings()
 
@@ -1,11 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1.endpoints import (googlesheet_router)
+from app.api.v1.endpoints import (counterparty_router, googlesheet_router)
 import uvicorn
 
-from app.database.db_connect import init_db, close_db
+from app.database.db_connect import init_db, close_db, warmup_pool
+from app.database.schema import apply_schema
+from app.database.repositories import GoogleSheetRepository, SheetCheckpointRepository
+from app.service import GoogleSheetService, SheetPushWorker, SyncJobManager
 from config import settings
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.infrastructure.counterparty_cache import CounterpartyCache
+from app.infrastructure.executor import shutdown_process_pool
+from app.infrastructure.metrics import observe_pool
 
 
 # Контекстный менеджер для управления жизненным циклом приложения
@@ -13,9 +21,35 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     # Инициализация пула соединений при старте приложения
     pool = await init_db()
+    push_enabled = bool(settings.SHEET_PUSH_ENABLED and settings.SHEET_PUSH_TARGETS)
+    await apply_schema(pool, notify_changes=push_enabled)
+    # соединения открываются и горячие запросы подготавливаются до первых запросов
+    await warmup_pool(pool, GoogleSheetRepository.HOT_STATEMENTS)
     app.state.pool = pool
+    app.state.sync_jobs = SyncJobManager(max_concurrent=settings.SYNC_MAX_CONCURRENCY)
+    app.state.counterparty_cache = CounterpartyCache(
+        ttl=settings.COUNTERPARTY_CACHE_TTL, batch_size=settings.EXPORT_BATCH_SIZE
+    )
+    # Фоновая отправка изменений test.test_table в листы (LISTEN/NOTIFY)
+    app.state.sheet_push = None
+    if push_enabled:
+        app.state.sheet_push = SheetPushWorker(
+            GoogleSheetService(
+                GoogleSheetRepository(pool), SheetCheckpointRepository(pool), app.state.counterparty_cache
+            ),
+            app.state.sync_jobs,
+            settings.SHEET_PUSH_TARGETS,
+            debounce=settings.SHEET_PUSH_DEBOUNCE,
+            max_delay=settings.SHEET_PUSH_MAX_DELAY,
+            retry_delay=settings.SHEET_PUSH_RETRY_DELAY,
+        )
+        await app.state.sheet_push.start()
     yield
-    # Закрытие пула соединений при завершении работы приложения
+    # Остановка фоновых задач и закрытие пула соединений при завершении работы приложения
+    if app.state.sheet_push is not None:
+        await app.state.sheet_push.stop()
+    await app.state.sync_jobs.shutdown()
+    shutdown_process_pool()
     await close_db(pool)
 
 
@@ -23,6 +57,21 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan, title="APKServiceAPI")
 
 app.include_router(googlesheet_router, prefix="/api")
+app.include_router(counterparty_router, prefix="/api")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus."""
+    observe_pool(app.state.pool)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/db_pool", include_in_schema=False)
+async def db_pool_stats():
+    """Размер, загрузка пула asyncpg и ожидание свободного соединения."""
+    return app.state.pool.stats()
+
 
 origins = [
     "*",  # временное решение
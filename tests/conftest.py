@@ -0,0 +1,10 @@
+import os
+
+# config.Settings требует переменные окружения; для тестов достаточно заглушек
+for _name, _value in {
+    "POSTGRES_USER": "test", "POSTGRES_PASSWORD": "test", "POSTGRES_DB": "test",
+    "POSTGRES_HOST": "localhost", "POSTGRES_PORT": "5432", "APP_IP_ADDRESS": "127.0.0.1",
+    "APP_PORT": "8000", "INITIAL_SERVICE_TOKEN": "test", "CREDS": "creds.json",
+    "GS_BACKOFF_BASE": "0.01", "GS_BACKOFF_MAX": "0.05",
+}.items():
+    os.environ.setdefault(_name, _value)
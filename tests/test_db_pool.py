@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.database.db_connect import InstrumentedPool, warmup_pool
+
+
+class FakePool:
+    """Минимальный пул asyncpg: acquire ждет delay, учитывает выданные соединения."""
+
+    def __init__(self, min_size: int = 2, delay: float = 0.01, fail_on: int = 0):
+        self.min_size = min_size
+        self.delay = delay
+        self.fail_on = fail_on
+        self.acquired = 0
+        self.released = []
+
+    async def acquire(self, *, timeout=None):
+        await asyncio.sleep(self.delay)
+        self.acquired += 1
+        if self.acquired == self.fail_on:
+            raise ConnectionError("connection refused")
+        return FakeConnection(self.acquired)
+
+    async def release(self, conn):
+        self.released.append(conn.number)
+
+    def get_min_size(self):
+        return self.min_size
+
+
+class FakeConnection:
+    def __init__(self, number: int):
+        self.number = number
+        self.prepared = []
+
+    async def executemany(self, statement, args):
+        self.prepared.append(statement)
+
+
+def test_acquire_records_wait_and_releases():
+    pool = InstrumentedPool(FakePool())
+
+    async def use():
+        async with pool.acquire() as conn:
+            return conn.number
+
+    assert asyncio.run(use()) == 1
+    assert pool.pool.released == [1]
+    assert pool.acquires == 1 and pool.waiting == 0
+    assert pool.acquire_wait_max >= 0.01
+
+
+def test_warmup_releases_connections_on_failure():
+    pool = InstrumentedPool(FakePool(min_size=3, fail_on=2))
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(warmup_pool(pool, ["SELECT 1"]))
+
+    assert pool.pool.released == [1]
+    assert pool.waiting == 0
@@ -0,0 +1,32 @@
+import asyncio
+
+from app.models import GoogleSheetParams, SyncDirection
+from app.service.jobs import SyncJobManager
+
+
+def _params(full_refresh: bool = False) -> GoogleSheetParams:
+    return GoogleSheetParams(spreadsheet="t", sheet="s", table_id_header="№", full_refresh=full_refresh)
+
+
+def test_full_refresh_queued_after_running_job():
+    order = []
+
+    def runner(name):
+        async def run(progress):
+            order.append(f"{name}:start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}:end")
+        return run
+
+    async def main():
+        manager = SyncJobManager()
+        direction = SyncDirection.DB_TO_SHEET
+        job, created = manager.submit(_params(), direction, runner("incremental"))
+        full, full_created = manager.submit(_params(full_refresh=True), direction, runner("full"))
+        # пока полная выгрузка в очереди, повторные запросы получают ее
+        repeated, repeated_created = manager.submit(_params(), direction, runner("repeated"))
+        await manager.wait(full.id)
+        return created, full_created, repeated_created, full.id == repeated.id, full.full_refresh
+
+    assert asyncio.run(main()) == (True, True, False, True, True)
+    assert order == ["incremental:start", "incremental:end", "full:start", "full:end"]
@@ -0,0 +1,68 @@
+import pytest
+
+from app.infrastructure.sheet_keys import SheetKeyIndex, normalize_key
+
+
+@pytest.mark.parametrize("value", [12, "12", "12.0", "12.00", " 12 ", 12.0, "+12"])
+def test_numeric_keys_normalized_to_int(value):
+    assert normalize_key(value) == 12
+
+
+@pytest.mark.parametrize("value, expected", [
+    # разделители разрядов, как их показывает лист
+    ("1 234", 1234),
+    ("1\u00a0234", 1234),
+    ("1\u202f234", 1234),
+    ("0", 0),
+    ("-5", -5),
+])
+def test_numeric_keys_with_separators(value, expected):
+    assert normalize_key(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    # ведущие нули - часть идентификатора, а не число
+    ("007", "007"),
+    (" 007 ", "007"),
+    ("12.5", "12.5"),
+    (12.5, "12.5"),
+    ("12a", "12a"),
+    ("  АБВ-1 ", "АБВ-1"),
+    ("1 2 3 a", "1 2 3 a"),
+    (True, "True"),
+])
+def test_non_numeric_keys_stay_strings(value, expected):
+    assert normalize_key(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "   ", float("nan"), float("inf")])
+def test_empty_keys(value):
+    assert normalize_key(value) is None
+
+
+def test_index_matches_sheet_and_db_representations():
+    index = SheetKeyIndex()
+    index.add("12.0", 2)
+    index.add("007", 3)
+    index.add(" 1 234 ", 4)
+    index.add("", 5)
+
+    assert index.get(12) == [2]
+    assert index.get("1234") == [4]
+    assert index.get("007") == [3]
+    # "7" и "007" - разные ключи
+    assert index.get(7) is None
+    assert len(index) == 3
+
+
+def test_index_keeps_duplicate_rows_and_reserves_new_keys():
+    index = SheetKeyIndex()
+    index.add("5", 2)
+    index.add(5.0, 7)
+    assert index.get("5") == [2, 7]
+
+    assert "9" not in index
+    index.reserve(9)
+    # зарезервированный ключ найден, но строк у него еще нет - второй раз не добавляется
+    assert "9.0" in index
+    assert index.get("9") == []
@@ -0,0 +1,61 @@
+from app.infrastructure.sheet_writer import a1_range, chunk_updates, coalesce_cells, column_letter
+
+
+def test_column_letter_and_a1_range():
+    assert [column_letter(col) for col in (1, 26, 27, 52, 703)] == ["A", "Z", "AA", "AZ", "AAA"]
+    assert a1_range(2, 3, 2, 3) == "C2"
+    assert a1_range(2, 1, 5, 28) == "A2:AB5"
+
+
+def test_coalesce_adjacent_cells_into_rectangles():
+    cells = {
+        (2, 2): "a", (2, 3): "b",
+        (3, 2): "c", (3, 3): "d",
+        # отдельная ячейка через колонку
+        (3, 5): "e",
+        # разрыв по строкам - новый прямоугольник того же отрезка
+        (5, 2): "f", (5, 3): "g",
+    }
+
+    assert coalesce_cells(cells) == [
+        {"range": "B2:C3", "values": [["a", "b"], ["c", "d"]]},
+        {"range": "E3", "values": [["e"]]},
+        {"range": "B5:C5", "values": [["f", "g"]]},
+    ]
+
+
+def test_coalesce_does_not_fill_gaps():
+    cells = {(2, 2): "a", (2, 3): "b", (3, 2): "c"}
+
+    updates = coalesce_cells(cells)
+
+    assert sum(len(row) for update in updates for row in update["values"]) == len(cells)
+    assert {update["range"] for update in updates} == {"B2:C2", "B3"}
+
+
+def test_coalesce_empty():
+    assert coalesce_cells({}) == []
+
+
+def test_chunk_updates_respects_cell_limit():
+    updates = [{"range": "A2:B11", "values": [[str(i), str(i)] for i in range(10)]}]
+
+    batches = list(chunk_updates(updates, max_cells=6, max_ranges=10))
+
+    assert [[part["range"] for part in batch] for batch in batches] == [
+        ["A2:B4"], ["A5:B7"], ["A8:B10"], ["A11:B11"],
+    ]
+    assert [row for batch in batches for part in batch for row in part["values"]] == updates[0]["values"]
+
+
+def test_chunk_updates_respects_range_limit():
+    updates = [{"range": f"A{row}", "values": [["x"]]} for row in range(2, 7)]
+
+    batches = list(chunk_updates(updates, max_cells=100, max_ranges=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [part for batch in batches for part in batch] == updates
+
+
+def test_chunk_updates_empty():
+    assert list(chunk_updates([], max_cells=10, max_ranges=10)) == []
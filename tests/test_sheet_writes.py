@@ -0,0 +1,261 @@
+import asyncio
+import re
+
+from app.infrastructure.checkpoint import MemoryCheckpointStore
+from app.infrastructure.emulator import EmulatedWorksheet, _api_error
+from app.infrastructure.googlesheet import PCGoogleSheet
+from app.infrastructure.rate_limit import SheetsRateLimiter
+from app.infrastructure.registry import SheetRegistry
+
+CREDS = "creds.json"
+_ROW = re.compile(r"(\d+)$")
+
+
+class GridWorksheet(EmulatedWorksheet):
+    """Лист с сеткой фиксированного размера: диапазоны за ее пределами - ошибка 400, как в API."""
+
+    def __init__(self, rows, grid_rows: int):
+        super().__init__(rows, title="s")
+        self.grid_rows = grid_rows
+
+    @property
+    def row_count(self) -> int:
+        return self.grid_rows
+
+    def _check(self, range_name: str) -> None:
+        end_row = int(_ROW.search(range_name).group(1))
+        if end_row > self.grid_rows:
+            raise _api_error(400, f"Range ('s'!{range_name}) exceeds grid limits. Max rows: {self.grid_rows}")
+
+    def batch_get(self, ranges, **kwargs):
+        for range_name in ranges:
+            self._check(range_name)
+        return super().batch_get(ranges, **kwargs)
+
+    def _sheet_range(self, range_name: str) -> str:
+        # проверка после того, как batch_update переписал диапазоны на месте, как в gspread
+        local = super()._sheet_range(range_name)
+        self._check(local)
+        return local
+
+    def add_rows(self, rows: int):
+        super().add_rows(rows)
+        self.grid_rows += rows
+
+
+class WorksheetHandle:
+    """Дескриптор листа как в gspread: размер сетки запоминается при получении."""
+
+    def __init__(self, worksheet: GridWorksheet):
+        self._worksheet = worksheet
+        self.row_count = worksheet.grid_rows
+        self.col_count = worksheet.col_count
+
+    def __getattr__(self, name):
+        return getattr(self._worksheet, name)
+
+
+class Spreadsheet:
+    def __init__(self, worksheet: GridWorksheet):
+        self.worksheet_data = worksheet
+
+    def worksheet(self, title: str) -> WorksheetHandle:
+        return WorksheetHandle(self.worksheet_data)
+
+
+class RejectingWorksheet(GridWorksheet):
+    """Лист, который отклоняет первые failures вызовов batch_update ошибкой 400."""
+
+    def __init__(self, rows, grid_rows: int, failures: int = 1):
+        super().__init__(rows, grid_rows)
+        self.failures = failures
+
+    def batch_update(self, data, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise _api_error(400, "Invalid requests[0].updateCells: range is protected")
+        return super().batch_update(data, **kwargs)
+
+
+class QuotaWorksheet(GridWorksheet):
+    """
+    Лист, который отвечает 429 на первые failures вызовов batch_update - уже после того,
+    как диапазоны переписаны на месте (как в gspread).
+    """
+
+    def __init__(self, rows, grid_rows: int, failures: int = 1):
+        super().__init__(rows, grid_rows)
+        self.failures = failures
+
+    def _request(self, method: str) -> None:
+        super()._request(method)
+        if method == "batch_update" and self.failures:
+            self.failures -= 1
+            raise _api_error(429, "Quota exceeded for quota metric 'Write requests'")
+
+
+def _client(worksheet: GridWorksheet, stale_rows: int) -> PCGoogleSheet:
+    limiter = SheetsRateLimiter(
+        read_per_minute=6000, write_per_minute=6000, burst=100,
+        max_retries=2, backoff_base=0.01, backoff_max=0.05,
+    )
+    registry = SheetRegistry(limiter=limiter)
+    registry.spreadsheets.set((CREDS, "t"), Spreadsheet(worksheet))
+    handle = WorksheetHandle(worksheet)
+    # дескриптор закэширован до того, как сетку листа уменьшили
+    handle.row_count = stale_rows
+    registry.worksheets.set((CREDS, "t", "s"), handle)
+    client = PCGoogleSheet(spreadsheet="t", sheet="s", creds_json=CREDS, registry=registry)
+    client.sheet = handle
+    return client
+
+
+def test_read_columns_after_grid_shrink():
+    worksheet = GridWorksheet([["№", "Наименование"], ["1", "A"], ["2", "B"]], grid_rows=10)
+    client = _client(worksheet, stale_rows=1000)
+
+    async def read():
+        return [page async for page in client.read_columns(["№", "Наименование"], page_rows=100)]
+
+    assert asyncio.run(read()) == [(2, [["1", "A"], ["2", "B"]])]
+    assert client.sheet.row_count == 10
+
+
+def test_new_rows_after_grid_shrink():
+    worksheet = GridWorksheet([["№", "Наименование"], ["1", "A"], ["2", "B"]], grid_rows=3)
+    client = _client(worksheet, stale_rows=1000)
+
+    counts = asyncio.run(client.update_revenue_rows({"3": {"Наименование": "C"}}, table_id="№"))
+
+    assert counts["inserted"] == 1
+    assert worksheet.rows[3] == ["3", "C"]
+    assert worksheet.grid_rows == 4
+
+
+def test_write_retried_after_grid_shrink():
+    worksheet = GridWorksheet([["№", "Наименование"], ["1", "A"], ["2", "B"]], grid_rows=3)
+    client = _client(worksheet, stale_rows=1000)
+    payload = {"new_rows": True, "first_row": 4, "columns": [0, 1], "rows": [["3", "C"]]}
+
+    asyncio.run(client._apply_batch(payload))
+
+    assert worksheet.rows[3] == ["3", "C"]
+    assert worksheet.grid_rows == 4
+    assert worksheet.calls["batch_update"] == 2
+
+
+def _sync(client: PCGoogleSheet, rows, checkpoint=None) -> dict:
+    async def batches():
+        yield rows
+
+    return asyncio.run(client.sync_rows(["№", "Наименование"], batches(), table_id="№", checkpoint=checkpoint))
+
+
+def _pending(checkpoint: MemoryCheckpointStore):
+    return asyncio.run(checkpoint.pending(("t", "s")))
+
+
+def test_new_rows_keep_data_below_table():
+    worksheet = GridWorksheet(
+        [["№", "Наименование", "Заметки"], ["1", "A", "n1"], ["2", "B", ""], ["", "", "note below table"]],
+        grid_rows=4,
+    )
+    client = _client(worksheet, stale_rows=4)
+
+    counts = _sync(client, [["3", "C"]])
+
+    assert counts["inserted"] == 1
+    assert worksheet.rows[3] == ["", "", "note below table"]
+    # пишутся только колонки выгрузки, колонка заметок новой строки не затирается
+    assert worksheet.rows[4] == ["3", "C"]
+
+
+def test_resumed_new_rows_are_applied_once():
+    worksheet = GridWorksheet([["№", "Наименование"], ["1", "A"]], grid_rows=2)
+    client = _client(worksheet, stale_rows=2)
+    checkpoint = MemoryCheckpointStore()
+    # пачка прерванной синхронизации: строка 3 так и не была записана
+    asyncio.run(checkpoint.add(("t", "s"), {"new_rows": True, "first_row": 3, "columns": [0, 1], "rows": [["2", "B"]]}))
+
+    counts = _sync(client, [["1", "A"], ["2", "B"]], checkpoint=checkpoint)
+
+    assert counts["inserted"] == 0 and counts["unchanged"] == 2
+    assert worksheet.rows[1:] == [["1", "A"], ["2", "B"]]
+    assert _pending(checkpoint) == []
+
+
+def test_resumed_new_rows_skipped_when_rows_taken():
+    worksheet = GridWorksheet([["№", "Наименование"], ["1", "A"], ["5", "X"]], grid_rows=3)
+    client = _client(worksheet, stale_rows=3)
+    checkpoint = MemoryCheckpointStore()
+    asyncio.run(checkpoint.add(("t", "s"), {"new_rows": True, "first_row": 3, "columns": [0, 1], "rows": [["2", "B"]]}))
+
+    counts = _sync(client, [["2", "B"]], checkpoint=checkpoint)
+
+    assert counts["inserted"] == 1
+    assert worksheet.rows[2] == ["5", "X"]
+    assert worksheet.rows[3] == ["2", "B"]
+    assert _pending(checkpoint) == []
+
+
+def test_rejected_resumed_batches_are_discarded():
+    worksheet = RejectingWorksheet([["№", "Наименование"], ["1", "A"]], grid_rows=2)
+    client = _client(worksheet, stale_rows=2)
+    checkpoint = MemoryCheckpointStore()
+    asyncio.run(checkpoint.add(("t", "s"), {"updates": [{"range": "B2", "values": [["Z"]]}]}))
+    asyncio.run(checkpoint.add(("t", "s"), {"updates": [{"range": "B2", "values": [["Y"]]}]}))
+
+    counts = _sync(client, [["1", "B"]], checkpoint=checkpoint)
+
+    assert counts["updated"] == 1
+    assert worksheet.rows[1] == ["1", "B"]
+    assert _pending(checkpoint) == []
+
+
+def test_write_retried_after_quota_error():
+    worksheet = QuotaWorksheet([["№", "Наименование"], ["1", "A"], ["2", "B"]], grid_rows=3)
+    client = _client(worksheet, stale_rows=3)
+
+    counts = asyncio.run(client.update_revenue_rows(
+        {"1": {"Наименование": "A2"}, "3": {"Наименование": "C"}}, table_id="№",
+    ))
+
+    assert counts["updated"] == 1 and counts["inserted"] == 1
+    assert worksheet.rows[1:] == [["1", "A2"], ["2", "B"], ["3", "C"]]
+    assert worksheet.calls["batch_update"] == 3
+
+
+def test_insert_data_correct_retried_after_quota_error():
+    worksheet = QuotaWorksheet([["№", "Наименование"], ["1", "A"], ["2", "B"]], grid_rows=3)
+    client = _client(worksheet, stale_rows=3)
+
+    asyncio.run(client.insert_data_correct({"2": {"Наименование": "B2"}}, sheet_header="№"))
+
+    assert worksheet.rows[1:] == [["1", "A"], ["2", "B2"]]
+    assert worksheet.calls["batch_update"] == 2
+
+
+def test_write_resumed_after_retries_exhausted():
+    # ограничитель делает 3 попытки (max_retries=2), четвертая - возобновление пачки из журнала
+    worksheet = QuotaWorksheet([["№", "Наименование"], ["1", "A"], ["2", "B"]], grid_rows=3, failures=3)
+    client = _client(worksheet, stale_rows=3)
+    checkpoint = MemoryCheckpointStore()
+
+    counts = _sync(client, [["1", "A2"], ["2", "B"]], checkpoint=checkpoint)
+
+    assert counts["updated"] == 1
+    assert worksheet.rows[1:] == [["1", "A2"], ["2", "B"]]
+    assert worksheet.calls["batch_update"] == 4
+    assert _pending(checkpoint) == []
+
+
+def test_memory_checkpoint_keeps_own_copies():
+    checkpoint = MemoryCheckpointStore()
+    payload = {"updates": [{"range": "B2", "values": [["Z"]]}]}
+    asyncio.run(checkpoint.add(("t", "s"), payload))
+
+    payload["updates"][0]["range"] = "'s'!B2"
+    [(_, pending)] = _pending(checkpoint)
+    pending["updates"][0]["range"] = "'s'!'s'!B2"
+
+    assert _pending(checkpoint)[0][1] == {"updates": [{"range": "B2", "values": [["Z"]]}]}